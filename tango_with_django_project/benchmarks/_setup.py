@@ -0,0 +1,50 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# Common setup of the benchmarks, imported before anything from Django:
+#   import _setup
+#   _setup.setup('search')
+#
+# A benchmark runs against a throwaway SQLite file, never the real
+# database, and on file caches of its own, never the ones the dev server
+# reads. Both live in a temporary directory removed at exit. The rango
+# tables are created from the models: migrate with run_syncdb=True.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                      'tango_with_django_project.settings')
+
+TEMP_DIR = tempfile.mkdtemp(prefix='rango-benchmark-')
+atexit.register(shutil.rmtree, TEMP_DIR, True)
+
+
+def setup(name, replica=False, lock_timeout=None, **overrides):
+    # name: of the database file. replica: add a second file as the read
+    # replica. lock_timeout: seconds a write waits for SQLite's lock.
+    # overrides: other settings.
+    # The settings read the database files from the environment, so they
+    # must not be loaded yet.
+    os.environ['RANGO_DB'] = 'sqlite'
+    os.environ['RANGO_DB_NAME'] = os.path.join(TEMP_DIR, name + '.sqlite3')
+    if replica:
+        os.environ['RANGO_DB_REPLICA_NAME'] = os.path.join(TEMP_DIR, name + '-replica.sqlite3')
+    else:
+        os.environ.pop('RANGO_DB_REPLICA_NAME', None)
+
+    from django.conf import settings
+
+    if lock_timeout is not None:
+        settings.DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = lock_timeout
+    settings.MIGRATION_MODULES = {'rango': None}
+    for alias, cache in settings.CACHES.items():
+        if cache['BACKEND'].endswith('FileBasedCache'):
+            cache['LOCATION'] = os.path.join(TEMP_DIR, 'cache', alias)
+    for setting, value in overrides.items():
+        setattr(settings, setting, value)
+
+    import django
+
+    django.setup()
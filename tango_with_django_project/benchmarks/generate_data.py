@@ -0,0 +1,66 @@
+import itertools
+import json
+import random
+import sys
+
+# Synthetic categories and pages for the benchmarks, as records for
+# rango.bulk_import (or "python manage.py import_rango").
+# Usage: python benchmarks/generate_data.py categories pages > data.jsonl
+#
+# Views and likes follow a Zipf distribution like real traffic does: the
+# object ranked r gets top / r ** s, so a handful of categories and pages
+# hold most of the counts and the long tail has next to nothing. Pages
+# are spread over the categories the same way.
+
+ZIPF_EXPONENT = 1.1
+MAX_VIEWS = 1000000
+MAX_LIKES = 50000
+
+
+def zipf_counts(n, top, s=ZIPF_EXPONENT, rng=random):
+    # n counts in random order, the largest top, the r-th largest top / r ** s
+    ranks = list(range(1, n + 1))
+    rng.shuffle(ranks)
+    return [int(top / rank ** s) for rank in ranks]
+
+
+class ZipfChooser(object):
+    # Picks items with probability proportional to 1 / rank ** s,
+    # the first item being rank 1
+    def __init__(self, items, s=ZIPF_EXPONENT, rng=random):
+        self.items = items
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(
+            1.0 / rank ** s for rank in range(1, len(items) + 1)))
+
+    def choose(self, k=1):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+
+def category_name(i):
+    return 'Category {0}'.format(i)
+
+
+def make_records(categories, pages, seed=0):
+    # Yields the category records, then the page records
+    rng = random.Random(seed)
+    names = [category_name(i) for i in range(1, categories + 1)]
+    views = zipf_counts(categories, MAX_VIEWS, rng=rng)
+    likes = zipf_counts(categories, MAX_LIKES, rng=rng)
+    for name, category_views, category_likes in zip(names, views, likes):
+        yield {'type': 'category', 'name': name,
+               'views': category_views, 'likes': category_likes}
+
+    owners = ZipfChooser(names, rng=rng)
+    page_views = zipf_counts(pages, MAX_VIEWS, rng=rng)
+    for i in range(pages):
+        yield {'type': 'page', 'category': owners.choose()[0],
+               'title': 'Page {0}'.format(i + 1),
+               'url': 'http://example.com/{0}'.format(i + 1),
+               'views': page_views[i]}
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    for record in make_records(*(args + [1000, 100000][len(args):])):
+        sys.stdout.write(json.dumps(record) + '\n')
@@ -0,0 +1,70 @@
+import sys
+import time
+from random import randint
+
+import _setup
+
+_setup.setup('leaderboard')
+from django.db import connection, transaction
+from rango import leaderboard
+from rango.models import Category, Page
+
+# Compares the index page top-5 queries with the cached leaderboard.
+# Usage: python benchmarks/leaderboard.py [categories] [pages] [repeats]
+# The defaults (100k categories, 10M pages) take a few minutes to load.
+
+
+def create_tables():
+    with connection.schema_editor() as editor:
+        editor.create_model(Category)
+        editor.create_model(Page)
+
+
+@transaction.atomic
+def load(categories, pages, chunk=100000):
+    cursor = connection.cursor()
+    for start in range(0, categories, chunk):
+        cursor.executemany(
+            'INSERT INTO rango_category (id, name, slug, views, likes) VALUES (%s, %s, %s, 0, %s)',
+            [(i, 'Category {0}'.format(i), 'category-{0}'.format(i), randint(0, 100000))
+             for i in range(start + 1, min(start + chunk, categories) + 1)])
+    for start in range(0, pages, chunk):
+        cursor.executemany(
+            'INSERT INTO rango_page (id, category_id, title, url, views) VALUES (%s, %s, %s, %s, %s)',
+            [(i, randint(1, categories), 'Page {0}'.format(i), 'http://example.com/{0}'.format(i),
+              randint(0, 1000000))
+             for i in range(start + 1, min(start + chunk, pages) + 1)])
+
+
+def timed(func, repeats):
+    start = time.time()
+    for i in range(repeats):
+        func()
+    return (time.time() - start) / repeats * 1000
+
+
+def queries():
+    list(Category.objects.order_by('-likes')[:5])
+    list(Page.objects.order_by('-views')[:5])
+
+
+def cached():
+    leaderboard.get_top_categories()
+    leaderboard.get_top_pages()
+
+
+def run(categories, pages, repeats):
+    create_tables()
+    start = time.time()
+    load(categories, pages)
+    print("Loaded {0} categories and {1} pages in {2:.1f}s".format(
+        categories, pages, time.time() - start))
+
+    leaderboard.rebuild()
+    print("order_by queries: {0:.3f} ms per index".format(timed(queries, repeats)))
+    print("leaderboard:      {0:.3f} ms per index".format(timed(cached, repeats)))
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:4]]
+    run(*(args + [100000, 10000000, 20][len(args):]))
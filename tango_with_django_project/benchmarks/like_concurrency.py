@@ -0,0 +1,59 @@
+import sys
+import threading
+import time
+
+import _setup
+
+_setup.setup('like_concurrency', lock_timeout=30)
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from rango import search
+from rango.models import Category
+
+# Hammers /rango/like/ from many threads at once and checks that every
+# like made it into the database.
+# Usage: python benchmarks/like_concurrency.py [threads] [likes_per_thread]
+
+
+def hammer(user, category, likes_per_thread, errors):
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    url = reverse('like_category')
+    for i in range(likes_per_thread):
+        response = client.get(url, {'category_id': category.id})
+        if response.status_code != 200:
+            errors.append(response.status_code)
+    connection.close()
+
+
+def run(threads, likes_per_thread):
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    search.rebuild_index()
+    user = User.objects.create_user('like-benchmark')
+    category = Category.objects.create(name='Like Benchmark')
+    errors = []
+    workers = [threading.Thread(target=hammer,
+                                args=(user, category, likes_per_thread, errors))
+               for i in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+
+    expected = threads * likes_per_thread
+    likes = Category.objects.get(id=category.id).likes
+    print("{0} likes in {1:.2f}s ({2:.0f} likes/sec), {3} failed requests".format(
+        expected, elapsed, expected / elapsed, len(errors)))
+    print("Likes stored: {0}, lost: {1}".format(likes, expected - len(errors) - likes))
+    return likes == expected - len(errors)
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    ok = run(*(args + [16, 50][len(args):]))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,329 @@
+import argparse
+import json
+import socketserver
+import subprocess
+import threading
+import time
+from random import Random
+from unittest import mock
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import _setup
+
+# Measure what production runs: DEBUG keeps every query in memory
+_setup.setup('load_test', lock_timeout=30, DEBUG=False, ALLOWED_HOSTS=['*'])
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.template import Context, Template
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rango import casa
+from rango.bulk_import import Importer
+from rango.models import Category
+from rango.view_counter import view_buffer
+
+from generate_data import ZipfChooser, make_records
+
+# Load test of the rango views, in process through the Django test client
+# and over HTTP against a local threaded WSGI server. Records latency
+# percentiles, requests/sec and SQL queries per request for each view and
+# writes them to a JSON report; --compare prints the change against the
+# report of an earlier commit.
+# Usage: python benchmarks/load_test.py [--categories N] [--pages M]
+#            [--workers W] [--requests R] [--output report.json]
+#            [--compare old.json]
+#
+# Categories and pages are picked with the same Zipf skew as the
+# generated counts, so the popular ones get most of the traffic.
+
+SCENARIOS = ['index', 'show_category', 'like_category', 'add_page', 'sidebar']
+# CASA is not called during the run, every visitor gets these
+CREDENTIALS = {'client_id': 'load-test', 'authToken': 'load-test'}
+
+
+def create_tables():
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+class Targets(object):
+    # What the scenarios request, chosen with a Zipf skew
+    def __init__(self, seed):
+        rng = Random(seed)
+        categories = list(Category.objects.order_by('-likes').values_list('id', 'slug'))
+        self.categories = ZipfChooser(categories, rng=rng)
+        self._counter = iter(range(1, 10 ** 9))
+        self._lock = threading.Lock()
+
+    def category(self):
+        return self.categories.choose()[0]
+
+    def page_title(self):
+        with self._lock:
+            return 'Load test page {0}'.format(next(self._counter))
+
+
+def make_request(scenario, targets):
+    # (method, path, data) for one request of a scenario
+    category_id, slug = targets.category()
+    if scenario == 'index':
+        return 'GET', reverse('index'), None
+    if scenario == 'show_category':
+        return 'GET', reverse('show_category', args=[slug]), None
+    if scenario == 'like_category':
+        return 'GET', reverse('like_category'), {'category_id': category_id}
+    if scenario == 'add_page':
+        return 'POST', reverse('add_page', args=[slug]), {
+            'title': targets.page_title(), 'url': 'http://example.com/', 'views': 0}
+    raise ValueError(scenario)
+
+
+SIDEBAR = Template('{% load rango_template_tags %}{% get_category_list %}')
+
+
+# Transports: each worker gets its own, logged in as its own session.
+# request() returns (status, queries).
+
+class ClientTransport(object):
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def request(self, method, path, data):
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'POST':
+                response = self.client.post(path, data)
+            else:
+                response = self.client.get(path, data)
+        return response.status_code, len(queries)
+
+    def close(self):
+        connection.close()
+
+
+class ServerTransport(object):
+    def __init__(self, user, server):
+        self.server = server
+        client = Client()
+        client.force_login(user)
+        self.session = requests.Session()
+        self.session.cookies[settings.SESSION_COOKIE_NAME] = \
+            client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def request(self, method, path, data):
+        url = self.server.url + path
+        if method == 'POST':
+            if settings.CSRF_COOKIE_NAME not in self.session.cookies:
+                # Any page with a form sets the CSRF cookie
+                self.session.get(url)
+            token = self.session.cookies[settings.CSRF_COOKIE_NAME]
+            response = self.session.post(url, data, headers={'X-CSRFToken': token})
+        else:
+            response = self.session.get(url, params=data)
+        # Counted on the server side, see QueryCountingApp
+        return response.status_code, int(response.headers.get('X-Load-Test-Queries', 0))
+
+    def close(self):
+        self.session.close()
+
+
+class DirectTransport(object):
+    # For what isn't a view: the sidebar is rendered by a template tag
+    def request(self, method, path, data):
+        with CaptureQueriesContext(connection) as queries:
+            SIDEBAR.render(Context({}))
+        return 200, len(queries)
+
+    def close(self):
+        connection.close()
+
+
+class QueryCountingApp(object):
+    # Sends the number of queries back in a header. Django has made them
+    # all by the time it starts the response.
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        queries = CaptureQueriesContext(connection)
+
+        def counting_start_response(status, headers, exc_info=None):
+            headers.append(('X-Load-Test-Queries', str(len(queries))))
+            return start_response(status, headers, exc_info)
+
+        with queries:
+            return self.app(environ, counting_start_response)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadedServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class LocalServer(object):
+    def __init__(self):
+        self.httpd = make_server('127.0.0.1', 0, QueryCountingApp(get_wsgi_application()),
+                                 server_class=ThreadedServer, handler_class=QuietHandler)
+        self.url = 'http://127.0.0.1:{0}'.format(self.httpd.server_port)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def percentile(timings, p):
+    return timings[min(int(len(timings) * p / 100.0), len(timings) - 1)]
+
+
+def run_scenario(scenario, make_transport, targets, workers, requests_per_worker):
+    timings = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+    ready = threading.Barrier(workers + 1)
+
+    def work():
+        transport = make_transport()
+        mine = []
+        try:
+            ready.wait()
+            for i in range(requests_per_worker):
+                if scenario == 'sidebar':
+                    request = (None, None, None)
+                else:
+                    request = make_request(scenario, targets)
+                start = time.time()
+                status, count = transport.request(*request)
+                mine.append(((time.time() - start) * 1000, count, status))
+        finally:
+            transport.close()
+        with lock:
+            for elapsed, count, status in mine:
+                timings.append(elapsed)
+                queries.append(count)
+                if status >= 400:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=work) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.time()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    timings.sort()
+    return {
+        'requests': len(timings),
+        'errors': len(errors),
+        'requests_per_second': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'queries_per_request': round(sum(queries) / float(len(queries)), 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(options):
+    create_tables()
+    start = time.time()
+    importer = Importer().run(make_records(options.categories, options.pages, options.seed))
+    print("Loaded {0} rows in {1:.1f}s".format(importer.rows, time.time() - start))
+
+    user = User.objects.create_user('load-test')
+    targets = Targets(options.seed)
+    server = LocalServer()
+    results = {}
+    try:
+        for scenario in options.scenarios:
+            results[scenario] = {}
+            if scenario == 'sidebar':
+                transports = {'direct': DirectTransport}
+            else:
+                transports = {'client': lambda: ClientTransport(user),
+                              'server': lambda: ServerTransport(user, server)}
+            for name in sorted(transports):
+                # Warm up caches and connections first
+                run_scenario(scenario, transports[name], targets, 1, options.warmup)
+                results[scenario][name] = result = run_scenario(
+                    scenario, transports[name], targets, options.workers,
+                    max(options.requests // options.workers, 1))
+                print("{0:<14} {1:<7} {2[requests_per_second]:>8.1f} req/s  "
+                      "p50 {2[p50_ms]:>7.2f}  p95 {2[p95_ms]:>7.2f}  p99 {2[p99_ms]:>7.2f} ms  "
+                      "{2[queries_per_request]:>5.2f} queries  {2[errors]} errors".format(
+                          scenario, name, result))
+    finally:
+        server.stop()
+        view_buffer.flush()
+
+    return {
+        'commit': git_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {'categories': options.categories, 'pages': options.pages,
+                   'workers': options.workers, 'requests': options.requests,
+                   'seed': options.seed},
+        'results': results,
+    }
+
+
+def compare(report, previous):
+    print("Change against {0}:".format(previous.get('commit')))
+    for scenario, transports in sorted(report['results'].items()):
+        for name, result in sorted(transports.items()):
+            old = previous['results'].get(scenario, {}).get(name)
+            if not old:
+                continue
+            changes = []
+            for key in ('requests_per_second', 'p50_ms', 'p95_ms', 'p99_ms'):
+                if old[key]:
+                    changes.append('{0} {1:+.0f}%'.format(key, (result[key] / old[key] - 1) * 100))
+            changes.append('queries_per_request {0:+.2f}'.format(
+                result['queries_per_request'] - old['queries_per_request']))
+            print("{0:<14} {1:<7} {2}".format(scenario, name, ', '.join(changes)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test of the rango views.")
+    parser.add_argument('--categories', type=int, default=1000)
+    parser.add_argument('--pages', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=800,
+                        help="Per scenario and transport, split over the workers")
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--output', default='load_test_report.json')
+    parser.add_argument('--compare', help="Report of an earlier run")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    options = parse_args()
+    with mock.patch.object(casa.token_store, 'get', return_value=CREDENTIALS):
+        report = run(options)
+    with open(options.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print("Report written to {0}".format(options.output))
+    if options.compare:
+        with open(options.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,70 @@
+import shutil
+from unittest import mock
+
+import _setup
+
+# Two SQLite files standing in for a primary and its read replica
+_setup.setup('replica', replica=True)
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rango import casa
+from rango.bulk_import import Importer
+
+from generate_data import make_records
+
+# Shows which database each view's queries go to, with the replica
+# router on two local SQLite files.
+# Usage: python benchmarks/replica.py
+
+
+def make_replica():
+    # Copy the primary, as replication would
+    connections['default'].close()
+    connections['replica'].close()
+    with open(settings.DATABASES['default']['NAME'], 'rb') as primary:
+        with open(settings.DATABASES['replica']['NAME'], 'wb') as replica:
+            shutil.copyfileobj(primary, replica)
+
+
+def count_queries(client, method, url, data=None):
+    with CaptureQueriesContext(connections['default']) as primary:
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(client, method)(url, data)
+    return response.status_code, len(primary), len(replica)
+
+
+def run():
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    Importer().run(make_records(20, 200))
+    user = User.objects.create_user('replica')
+    # Checkpoint, so the primary file holds everything before it is copied
+    with connections['default'].cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode = DELETE')
+    make_replica()
+
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    slug = 'category-1'
+    requests = [
+        ('index', 'get', reverse('index'), None),
+        ('show_category', 'get', reverse('show_category', args=[slug]), None),
+        ('category_pages', 'get', reverse('category_pages', args=[slug]), None),
+        ('like_category', 'get', reverse('like_category'), {'category_id': 1}),
+        ('add_page', 'post', reverse('add_page', args=[slug]),
+         {'title': 'New page', 'url': 'http://example.com/', 'views': 0}),
+    ]
+    credentials = {'client_id': 'replica', 'authToken': 'replica'}
+    with mock.patch.object(casa.token_store, 'get', return_value=credentials):
+        print("{0:<16} {1:>6} {2:>8} {3:>8}".format('view', 'status', 'primary', 'replica'))
+        for name, method, url, data in requests:
+            print("{0:<16} {1:>6} {2:>8} {3:>8}".format(
+                name, *count_queries(client, method, url, data)))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,48 @@
+import sys
+import time
+
+import _setup
+
+_setup.setup('request_timing')
+from django.conf import settings
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import Client
+from django.test.utils import override_settings
+
+# Cost of RequestTimingMiddleware on the about page: left out of
+# MIDDLEWARE_CLASSES, installed with sampling off, and timing everything.
+# Usage: python benchmarks/request_timing.py [requests] [rounds]
+
+WITHOUT = [m for m in settings.MIDDLEWARE_CLASSES if m != 'rango.middleware.RequestTimingMiddleware']
+
+
+def timed_requests(requests, **overrides):
+    with override_settings(**overrides):
+        client = Client(SERVER_NAME='localhost')
+        url = reverse('about')
+        client.get(url)
+        start = time.time()
+        for i in range(requests):
+            client.get(url)
+        return (time.time() - start) / requests * 1000
+
+
+def run(requests, rounds):
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    # Interleave the rounds so drift in machine speed hits all three alike
+    results = {'without': [], 'off': [], 'on': []}
+    for i in range(rounds):
+        results['without'].append(timed_requests(requests, MIDDLEWARE_CLASSES=WITHOUT))
+        results['off'].append(timed_requests(requests, RANGO_TIMING_SAMPLE_RATE=0))
+        results['on'].append(timed_requests(requests, RANGO_TIMING_SAMPLE_RATE=1,
+                                                RANGO_TIMING_HEADER=True))
+    base = min(results['without'])
+    for name in ('without', 'off', 'on'):
+        best = min(results[name])
+        print("{0:<8} {1:.3f} ms/request ({2:+.1f}%)".format(name, best, (best / base - 1) * 100))
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*(args + [2000, 5][len(args):]))
@@ -0,0 +1,73 @@
+import sys
+import threading
+import time
+from unittest import mock
+
+import _setup
+
+_setup.setup('response_cache', lock_timeout=30)
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rango import casa
+from rango.bulk_import import Importer
+from rango.models import Category
+
+from generate_data import make_records
+
+# Anonymous visitors on the index, about and category pages, with the
+# response cache off and on.
+# Usage: python benchmarks/response_cache.py [threads] [requests_per_thread]
+
+TIMEOUTS = [0, 60]
+
+
+def visit(urls, requests_per_thread, timings, queries):
+    client = Client(SERVER_NAME='localhost')
+    for i in range(requests_per_thread):
+        url = urls[i % len(urls)]
+        with CaptureQueriesContext(connection) as captured:
+            start = time.time()
+            client.get(url)
+            timings.append((time.time() - start) * 1000)
+        queries.append(len(captured))
+    connection.close()
+
+
+def run_timeout(timeout, urls, threads, requests_per_thread):
+    timings = []
+    queries = []
+    caches['responses'].clear()
+    settings.RANGO_RESPONSE_CACHE_TIMEOUT = timeout
+    workers = [threading.Thread(target=visit, args=(urls, requests_per_thread, timings, queries))
+               for i in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    timings.sort()
+    print("timeout {0:<3} {1:>8.1f} req/s  p50 {2:.2f} ms  p95 {3:.2f} ms  {4:.2f} queries".format(
+        timeout, len(timings) / elapsed, timings[len(timings) // 2],
+        timings[int(len(timings) * 0.95)], sum(queries) / float(len(queries))))
+
+
+def run(threads, requests_per_thread):
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    Importer().run(make_records(50, 2000))
+    urls = [reverse('index'), reverse('about')]
+    urls += [reverse('show_category', args=[slug])
+             for slug in Category.objects.values_list('slug', flat=True)[:10]]
+    with mock.patch.object(casa.token_store, 'get', return_value=None):
+        for timeout in TIMEOUTS:
+            run_timeout(timeout, urls, threads, requests_per_thread)
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*(args + [8, 200][len(args):]))
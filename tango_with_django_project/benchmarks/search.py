@@ -0,0 +1,80 @@
+import sys
+import time
+from random import randint, sample
+
+import _setup
+
+_setup.setup('search')
+from django.db import connection, transaction
+from rango import search
+from rango.models import Category, Page
+
+# Times rango.search.search() over a generated corpus.
+# Usage: python benchmarks/search.py [categories] [pages] [queries]
+
+# Word frequencies in titles are skewed like real text: a few words are
+# very common, most are rare.
+VOCABULARY = ['word{0}'.format(i) for i in range(50000)]
+
+
+def random_word():
+    return VOCABULARY[min(int(len(VOCABULARY) * (randint(1, 1000) / 1000.0) ** 3),
+                          len(VOCABULARY) - 1)]
+
+
+def random_title():
+    return ' '.join(random_word() for i in range(randint(2, 6)))
+
+
+def create_tables():
+    with connection.schema_editor() as editor:
+        editor.create_model(Category)
+        editor.create_model(Page)
+
+
+@transaction.atomic
+def load(categories, pages, chunk=100000):
+    cursor = connection.cursor()
+    for start in range(0, categories, chunk):
+        cursor.executemany(
+            'INSERT INTO rango_category (id, name, slug, views, likes) VALUES (%s, %s, %s, 0, %s)',
+            [(i, 'Category {0} {1}'.format(i, random_word()), 'category-{0}'.format(i),
+              randint(0, 1000))
+             for i in range(start + 1, min(start + chunk, categories) + 1)])
+    for start in range(0, pages, chunk):
+        cursor.executemany(
+            'INSERT INTO rango_page (id, category_id, title, url, views) VALUES (%s, %s, %s, %s, %s)',
+            [(i, randint(1, categories), random_title(),
+              'http://{0}.example.com/{1}'.format(random_word(), i), randint(0, 100000))
+             for i in range(start + 1, min(start + chunk, pages) + 1)])
+    search.rebuild_index()
+
+
+def run(categories, pages, queries):
+    create_tables()
+    start = time.time()
+    load(categories, pages)
+    print("Indexed {0} categories and {1} pages in {2:.1f}s".format(
+        categories, pages, time.time() - start))
+
+    timings = []
+    for i in range(queries):
+        query = ' '.join(sample(VOCABULARY[100:], randint(1, 2)))
+        start = time.time()
+        search.search(query)
+        timings.append((time.time() - start) * 1000)
+    # Worst case: the prefix 'word1' matches 11111 words, among them the
+    # most common ones
+    start = time.time()
+    search.search('word1')
+    worst = (time.time() - start) * 1000
+
+    timings.sort()
+    print("{0} queries: p50 {1:.2f} ms, p95 {2:.2f} ms, max {3:.2f} ms".format(
+        queries, timings[len(timings) // 2], timings[int(len(timings) * 0.95)], timings[-1]))
+    print("Prefix matching the most common words: {0:.2f} ms".format(worst))
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:4]]
+    run(*(args + [10000, 1000000, 200][len(args):]))
@@ -0,0 +1,65 @@
+import sys
+import threading
+import time
+from unittest import mock
+
+import _setup
+
+_setup.setup('sessions', lock_timeout=30)
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rango import casa
+
+# Compares the database session backend with rango.sessions on the index
+# page, which writes to the session on every visit, with concurrent
+# visitors each keeping their own session.
+# Usage: python benchmarks/sessions.py [threads] [requests_per_thread]
+
+ENGINES = ['django.contrib.sessions.backends.db', 'rango.sessions']
+
+
+def visit(requests_per_thread, timings, queries):
+    client = Client(SERVER_NAME='localhost')
+    url = reverse('index')
+    client.get(url)
+    for i in range(requests_per_thread):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.time()
+            client.get(url)
+            timings.append((time.time() - start) * 1000)
+        queries.append(len(captured))
+    connection.close()
+
+
+def run_engine(engine, threads, requests_per_thread):
+    timings = []
+    queries = []
+    with override_settings(SESSION_ENGINE=engine):
+        workers = [threading.Thread(target=visit, args=(requests_per_thread, timings, queries))
+                   for i in range(threads)]
+        start = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.time() - start
+    timings.sort()
+    print("{0:<38} {1:>7.1f} req/s  p50 {2:.2f} ms  p95 {3:.2f} ms  {4:.2f} queries".format(
+        engine, len(timings) / elapsed, timings[len(timings) // 2],
+        timings[int(len(timings) * 0.95)], sum(queries) / float(len(queries))))
+
+
+def run(threads, requests_per_thread):
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    credentials = {'client_id': 'benchmark', 'authToken': 'benchmark'}
+    with mock.patch.object(casa.token_store, 'get', return_value=credentials):
+        for engine in ENGINES:
+            run_engine(engine, threads, requests_per_thread)
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*(args + [8, 200][len(args):]))
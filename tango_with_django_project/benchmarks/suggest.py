@@ -0,0 +1,44 @@
+import sys
+import time
+import tracemalloc
+from random import choice, randint
+
+import _setup
+
+_setup.setup('suggest')
+from rango.suggest import NameIndex
+
+# Memory footprint and lookup time of the category suggestion index.
+# Usage: python benchmarks/suggest.py [categories] [lookups]
+
+SYLLABLES = ['py', 'thon', 'dja', 'ngo', 'ra', 'ngo', 'web', 'dev', 'data', 'base',
+             'tan', 'go', 'fla', 'sk', 'bot', 'tle', 'sci', 'ence', 'ma', 'th']
+
+
+def random_name(i):
+    words = [''.join(choice(SYLLABLES) for s in range(randint(1, 4))) for w in range(randint(1, 3))]
+    return '{0} {1}'.format(' '.join(words).title(), i)
+
+
+def run(categories, lookups):
+    # Everything allocated while loading, the name strings included
+    tracemalloc.start()
+    index = NameIndex()
+    index.load(random_name(i) for i in range(categories))
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{0} names: {1:.1f} MB held, {2:.1f} MB peak while loading".format(
+        categories, size / 1024.0 / 1024, peak / 1024.0 / 1024))
+
+    prefixes = [''.join(choice(SYLLABLES) for s in range(randint(1, 2)))[:randint(1, 5)]
+                for i in range(lookups)]
+    start = time.time()
+    for prefix in prefixes:
+        index.starting_with(prefix, 8)
+    elapsed = time.time() - start
+    print("{0} lookups: {1:.1f} microseconds each".format(lookups, elapsed / lookups * 1000000))
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*(args + [1000000, 100000][len(args):]))
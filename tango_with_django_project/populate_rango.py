@@ -6,7 +6,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE',
 import django
 
 django.setup()
-from rango.models import Category, Page
+from rango.bulk_import import Importer
+from rango.models import Page
 
 
 def populate():
@@ -54,37 +55,27 @@ def populate():
     # If you want to add more categories or pages,
     # add them to the dictionaries above
 
-    # The code below goes through the cats dictionary, then adds each category,
-    # and then adds all associated pages for that category.
+    # The code below turns the cats dictionary into one record per category
+    # and per page and hands them to the bulk importer, which writes them in
+    # a few queries and updates the rows that are already there, so the
+    # script can be run more than once. See rango/bulk_import.py, and
+    # "python manage.py import_rango" to load larger files.
     # http://docs.quantifiedcode.com/python-anti-patterns/readability/
     # for more information about how to iterate over a dictionary properly.
 
-    for cat, cat_data in cats.items():
-        c = add_cat(cat)
-        if __name__ == '__main__':
-            for p in cat_data["pages"]:
-                add_page(c, p["title"], p["url"], p["views"])
+    Importer().run(make_records(cats))
 
     # Print out the categories we have added
-    for c in Category.objects.all():
-        for p in Page.objects.filter(category=c):
-            print("- {0} - {1}".format(str(c), str(p)))
-
+    for p in Page.objects.select_related('category').order_by('category', 'id'):
+        print("- {0} - {1}".format(str(p.category), str(p)))
 
-def add_page(cat, title, url, views):
-    p = Page.objects.get_or_create(category=cat, title=title)[0]
-    p.url = url
-    p.views = views
-    p.save()
-    return p
 
-
-def add_cat(name):
-    likes = randint(0, 50)
-    c = Category.objects.get_or_create(name=name)[0]
-    setattr(c, 'likes', likes)
-    c.save()
-    return c
+def make_records(cats):
+    for cat, cat_data in cats.items():
+        yield {"type": "category", "name": cat, "likes": randint(0, 50)}
+        for p in cat_data["pages"]:
+            yield {"type": "page", "category": cat, "title": p["title"],
+                   "url": p["url"], "views": p["views"]}
 
 
 if __name__ == "__main__":
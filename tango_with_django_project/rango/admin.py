@@ -1,10 +1,11 @@
 from django.contrib import admin
-from rango.models import Category, Page, UserProfile
+from rango.models import Category, DailyVisits, Page, UserProfile
 
 # Register your models here.
 
 admin.site.register(Page)
 admin.site.register(UserProfile)
+admin.site.register(DailyVisits)
 
 
 # Add in this class to customise the Admin Interface
@@ -0,0 +1,136 @@
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers, status
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+from rango.db import read_from_replica
+from rango.models import Category, Page
+from rango.pagination import get_categories_after, get_pages_after
+from rango.resolver import get_category
+
+
+# JSON API
+# Read endpoints for categories and pages, a batch lookup of categories
+# by slug, and bulk creation of a category's pages:
+#   GET  api/categories/?cursor=&fields=
+#   GET  api/batch/categories/?slugs=python,django&fields=
+#   GET  api/categories/<slug>/pages/?cursor=&fields=
+#   POST api/categories/<slug>/pages/  [{"title": ..., "url": ...}, ...]
+#
+# Lists come in batches of RANGO_API_PAGE_SIZE with the cursor of the
+# next batch, keyset paginated like category_pages: categories by id,
+# pages most viewed first. ?fields=name,slug sends only those fields and
+# loads only those columns.
+#
+# Reads go to the replica and are not counted as views. Writes need a
+# logged in user, see REST_FRAMEWORK in settings.
+
+def get_page_size():
+    return getattr(settings, 'RANGO_API_PAGE_SIZE', 50)
+
+
+def get_batch_size():
+    return getattr(settings, 'RANGO_API_BATCH_SIZE', 100)
+
+
+class SparseModelSerializer(serializers.ModelSerializer):
+    # Leaves out the fields not named in fields=
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super(SparseModelSerializer, self).__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CategorySerializer(SparseModelSerializer):
+    class Meta:
+        model = Category
+        fields = ('id', 'name', 'slug', 'views', 'likes')
+
+
+class PageSerializer(SparseModelSerializer):
+    class Meta:
+        model = Page
+        fields = ('id', 'title', 'url', 'views')
+        # New pages start with no views, like in add_page
+        read_only_fields = ('id', 'views')
+
+
+def get_fields(request, serializer_class):
+    # The fields asked for with ?fields=, or all of them
+    fields = request.query_params.get('fields')
+    if not fields:
+        return list(serializer_class.Meta.fields)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = set(fields) - set(serializer_class.Meta.fields)
+    if unknown:
+        raise ValidationError({'fields': "Unknown fields: {0}".format(', '.join(sorted(unknown)))})
+    return fields
+
+
+def serialize(serializer_class, objects, fields):
+    return serializer_class(objects, many=True, fields=fields).data
+
+
+@read_from_replica
+@api_view(['GET'])
+def category_list(request):
+    fields = get_fields(request, CategorySerializer)
+    categories, next_cursor = get_categories_after(
+        Category.objects.only('id', *fields), request.query_params.get('cursor'),
+        get_page_size())
+    return Response({'results': serialize(CategorySerializer, categories, fields),
+                     'next_cursor': next_cursor})
+
+
+@read_from_replica
+@api_view(['GET'])
+def category_batch(request):
+    # Many categories by slug in one query, in the order asked for
+    fields = get_fields(request, CategorySerializer)
+    slugs = [slug for slug in request.query_params.get('slugs', '').split(',') if slug]
+    if len(slugs) > get_batch_size():
+        raise ValidationError({'slugs': "At most {0} slugs".format(get_batch_size())})
+    found = dict((category.slug, category) for category in
+                 Category.objects.filter(slug__in=slugs).only('slug', *fields))
+    return Response({
+        'results': serialize(CategorySerializer, [found[slug] for slug in slugs if slug in found],
+                             fields),
+        'missing': [slug for slug in slugs if slug not in found],
+    })
+
+
+@read_from_replica
+@api_view(['GET', 'POST'])
+def category_page_list(request, category_name_slug):
+    category = get_category(category_name_slug)
+    if category is None:
+        raise NotFound("No such category")
+    if request.method == 'POST':
+        return create_pages(request, category)
+
+    fields = get_fields(request, PageSerializer)
+    # views and id are needed for the cursor
+    pages, next_cursor = get_pages_after(
+        Page.objects.filter(category_id=category.id).only('id', 'views', *fields),
+        request.query_params.get('cursor'), get_page_size())
+    return Response({'results': serialize(PageSerializer, pages, fields),
+                     'next_cursor': next_cursor})
+
+
+def create_pages(request, category):
+    # Every page or none. Each page is saved on its own, inside a single
+    # transaction, so the signal receivers keep the search index, the
+    # leaderboards and the caches in step as they do for add_page.
+    if not isinstance(request.data, list):
+        raise ValidationError("Expected a list of pages")
+    if len(request.data) > get_batch_size():
+        raise ValidationError("At most {0} pages".format(get_batch_size()))
+    serializer = PageSerializer(data=request.data, many=True)
+    serializer.is_valid(raise_exception=True)
+    with transaction.atomic():
+        pages = serializer.save(category=category, views=0)
+    return Response(PageSerializer(pages, many=True).data, status=status.HTTP_201_CREATED)
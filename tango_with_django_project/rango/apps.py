@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class RangoConfig(AppConfig):
     name = 'rango'
+
+    def ready(self):
+        # Connect the signal receivers
+        import rango.conditional  # noqa
+        import rango.db  # noqa
+        import rango.leaderboard  # noqa
+        import rango.sidebar  # noqa
+        import rango.resolver  # noqa
+        import rango.response_cache  # noqa
+        import rango.search  # noqa
+        import rango.suggest  # noqa
@@ -0,0 +1,162 @@
+import gzip
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# STATIC ASSETS
+# "python manage.py build_static" bundles and minifies the rango scripts
+# listed in RANGO_JS_BUNDLES into RANGO_BUILD_DIR, then runs
+# collectstatic. The storage below copies every file to STATIC_ROOT under
+# a content-hashed name, records the names in staticfiles.json, and
+# writes .gz and .br versions next to the text files for the web server
+# to send as they are (nginx: gzip_static, brotli_static).
+#
+# {% static %} resolves the hashed names from the manifest. A name that
+# isn't in it, as in development before a build, stays as it is.
+
+COMPRESSED_EXTENSIONS = ('.js', '.css', '.svg', '.ico', '.json', '.txt', '.map')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        try:
+            return super(CompressedManifestStaticFilesStorage, self).stored_name(name)
+        except ValueError:
+            # Not collected
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed_files = super(CompressedManifestStaticFilesStorage, self).post_process(
+            paths, dry_run, **options)
+        for name, hashed_name, processed in processed_files:
+            if hashed_name and not dry_run and not isinstance(processed, Exception):
+                compress(self.path(hashed_name))
+            yield name, hashed_name, processed
+
+
+def compress(path):
+    # Writes path.gz and path.br, when they come out smaller
+    if not path.endswith(COMPRESSED_EXTENSIONS):
+        return []
+    with open(path, 'rb') as f:
+        content = f.read()
+    versions = [('.gz', gzip.compress(content, 9))]
+    if brotli is not None:
+        versions.append(('.br', brotli.compress(content)))
+    written = []
+    for extension, compressed in versions:
+        if len(compressed) < len(content):
+            with open(path + extension, 'wb') as f:
+                f.write(compressed)
+            written.append(path + extension)
+    return written
+
+
+# JAVASCRIPT MINIFICATION
+# minify_js() drops comments, indentation and blank lines, and nothing
+# else. Line breaks stay, so automatic semicolon insertion works as
+# before. The source is read token by token, so a /* or // inside a
+# string, template or regular expression literal is left alone. A slash
+# starts a regular expression where an operand is expected: at the start,
+# after an operator or an opening bracket, or after a keyword such as
+# return.
+
+JS_TOKEN = re.compile(r'''
+    (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|`(?:[^`\\]|\\.)*`)
+  | (?P<block>/\*.*?(?:\*/|\Z))
+  | (?P<line>//[^\n]*)
+  | (?P<word>[\w$]+)
+  | (?P<space>[ \t\r\f\v]+)
+  | (?P<newline>\n)
+  | (?P<other>.)
+''', re.DOTALL | re.VERBOSE)
+
+JS_REGEX = re.compile(r'/(?![*/])(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*')
+
+JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+
+JS_REGEX_KEYWORDS = {
+    'case', 'delete', 'do', 'else', 'in', 'instanceof', 'new', 'return',
+    'throw', 'typeof', 'void', 'yield',
+}
+
+
+def _regex_allowed(previous):
+    if not previous:
+        return True
+    if previous in JS_REGEX_KEYWORDS:
+        return True
+    return previous in JS_REGEX_AFTER
+
+
+def minify_js(source):
+    lines = []
+    line = []
+    previous = ''
+    pos = 0
+
+    def end_line():
+        text = ''.join(line).rstrip()
+        if text:
+            lines.append(text)
+        del line[:]
+
+    while pos < len(source):
+        match = None
+        if source[pos] == '/' and _regex_allowed(previous):
+            match = JS_REGEX.match(source, pos)
+        if match:
+            kind = 'string'
+        else:
+            match = JS_TOKEN.match(source, pos)
+            kind = match.lastgroup
+        text = match.group()
+        pos = match.end()
+
+        if kind == 'newline' or (kind == 'block' and '\n' in text):
+            end_line()
+        elif kind in ('space', 'block'):
+            if line:
+                line.append(' ')
+        elif kind == 'line':
+            pass
+        elif kind == 'string':
+            line.append(text)
+            previous = '"'
+        else:
+            line.append(text)
+            previous = text
+    end_line()
+    return '\n'.join(lines) + '\n'
+
+
+def build_bundles():
+    # Returns {bundle: (source bytes, bundle bytes)}
+    sizes = {}
+    for bundle, sources in settings.RANGO_JS_BUNDLES.items():
+        parts = []
+        for source in sources:
+            path = finders.find(source)
+            if path is None:
+                raise ValueError("Static file {0} of bundle {1} not found".format(source, bundle))
+            with open(path, encoding='utf-8') as f:
+                parts.append(f.read())
+        # The semicolon ends a last statement that relied on ASI
+        content = minify_js(';\n'.join(parts))
+        target = os.path.join(settings.RANGO_BUILD_DIR, bundle)
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(content)
+        sizes[bundle] = (sum(len(part.encode('utf-8')) for part in parts),
+                         len(content.encode('utf-8')))
+    return sizes
@@ -0,0 +1,229 @@
+import logging
+import queue
+import threading
+import time
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.template.defaultfilters import slugify
+
+from rango.models import Category, Page
+from rango.resolver import LRUCache
+from rango.signals import bulk_imported
+
+logger = logging.getLogger(__name__)
+
+
+# BULK IMPORT
+# Loads categories and pages from a stream of records, in batches:
+#   {'type': 'category', 'name': ..., 'views': ..., 'likes': ...}
+#   {'type': 'page', 'category': <category name>, 'title': ..., 'url': ..., 'views': ...}
+#
+# Each batch is written in one transaction: rows that don't exist yet are
+# inserted with bulk_create(), rows that do are only updated if their
+# values changed. Categories are matched on name, pages on category and
+# title, so running the same import twice changes nothing. Pages may name
+# a category that was not imported yet, it is then created with zero
+# counts and filled in when its own record arrives.
+#
+# A category's slug comes from its name and is unique too. A new category
+# whose slug is already taken by another name, like "python" next to
+# "Python" or "C++" after "C", is skipped, with its pages, and logged,
+# rather than failing the batch.
+
+class Importer(object):
+    def __init__(self, batch_size=500, workers=1):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.rows = 0
+        self.error = None
+        self._lock = threading.Lock()
+        # Bounded, so memory stays flat however many categories there are
+        self._category_ids = LRUCache(100000)
+
+    def run(self, records):
+        start = time.time()
+        if self.workers <= 1:
+            # Everything in this thread, on its connection
+            try:
+                for batch in self._batches(records):
+                    self._import_batch(batch)
+            finally:
+                bulk_imported.send(sender=self.__class__)
+                self.elapsed = time.time() - start
+            return self
+
+        batches = queue.Queue(maxsize=self.workers * 2)
+        threads = [threading.Thread(target=self._work, args=(batches,))
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for batch in self._batches(records):
+                batches.put(batch)
+        finally:
+            for thread in threads:
+                batches.put(None)
+            for thread in threads:
+                thread.join()
+            # Also after a failure, the batches before it are committed
+            bulk_imported.send(sender=self.__class__)
+            self.elapsed = time.time() - start
+        if self.error:
+            raise self.error
+        return self
+
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0
+
+    def _batches(self, records):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _work(self, batches):
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return
+                if self.error:
+                    # Keep draining the queue so the reader doesn't block
+                    continue
+                try:
+                    try:
+                        self._import_batch(batch)
+                    except IntegrityError:
+                        # Another worker created one of our categories at the
+                        # same time, with it in place the retry goes through.
+                        self._import_batch(batch)
+                except Exception as e:
+                    logger.exception("Import batch failed")
+                    self.error = e
+        finally:
+            # Each worker thread has its own connection
+            connection.close()
+
+    def _import_batch(self, batch):
+        categories = {}
+        pages = {}
+        for record in batch:
+            if record.get('type') == 'category':
+                categories[record['name']] = record
+            else:
+                pages[(record['category'], record['title'])] = record
+
+        new_ids = {}
+        with transaction.atomic():
+            created, updated, skipped = self._import_categories(categories.values())
+            page_created, page_updated, page_skipped = self._import_pages(pages.values(), new_ids)
+
+        # Only remember category ids once they are committed
+        for name, category_id in new_ids.items():
+            self._category_ids.set(name, category_id)
+        with self._lock:
+            self.rows += len(batch)
+            self.created += created + page_created
+            self.updated += updated + page_updated
+            self.skipped += skipped + page_skipped
+
+    def _find_categories(self, names, fields):
+        # The existing categories with these names, by name, and the name
+        # of the category holding each slug these names would take
+        categories = list(Category.objects.filter(
+            Q(name__in=names) | Q(slug__in=[slugify(name) for name in names]))
+            .only('name', 'slug', *fields))
+        names = set(names)
+        return (dict((c.name, c) for c in categories if c.name in names),
+                dict((c.slug, c.name) for c in categories))
+
+    def _import_categories(self, records):
+        records = list(records)
+        existing, slugs = self._find_categories([r['name'] for r in records], ['views', 'likes'])
+        new = []
+        updated = 0
+        skipped = 0
+        for record in records:
+            views = int(record.get('views') or 0)
+            likes = int(record.get('likes') or 0)
+            category = existing.get(record['name'])
+            if category is None:
+                slug = slugify(record['name'])
+                if slug in slugs:
+                    logger.warning("Skipped category %r, its slug %r belongs to %r",
+                                   record['name'], slug, slugs[slug])
+                    skipped += 1
+                    continue
+                slugs[slug] = record['name']
+                new.append(Category(name=record['name'], slug=slug, views=views, likes=likes))
+            elif (category.views, category.likes) != (views, likes):
+                Category.objects.filter(id=category.id).update(views=views, likes=likes)
+                updated += 1
+        Category.objects.bulk_create(new)
+        return len(new), updated, skipped
+
+    def _get_category_ids(self, names, new_ids):
+        # Leaves out the names whose slug belongs to another category
+        ids = {}
+        missing = []
+        for name in names:
+            category_id = self._category_ids.get(name)
+            if category_id is None:
+                missing.append(name)
+            else:
+                ids[name] = category_id
+        if missing:
+            existing, slugs = self._find_categories(missing, [])
+            found = dict((name, category.id) for name, category in existing.items())
+            new = []
+            for name in missing:
+                slug = slugify(name)
+                if name not in found and slug not in slugs:
+                    slugs[slug] = name
+                    new.append(Category(name=name, slug=slug))
+            if new:
+                Category.objects.bulk_create(new)
+                found.update(Category.objects.filter(name__in=[c.name for c in new])
+                             .values_list('name', 'id'))
+            new_ids.update(found)
+            ids.update(found)
+        return ids
+
+    def _import_pages(self, records, new_ids):
+        records = list(records)
+        if not records:
+            return 0, 0, 0
+        category_ids = self._get_category_ids(set(r['category'] for r in records), new_ids)
+        skipped = 0
+        existing = {}
+        for page in Page.objects.filter(category_id__in=category_ids.values(),
+                                        title__in=[r['title'] for r in records]) \
+                .only('id', 'category_id', 'title', 'url', 'views'):
+            existing[(page.category_id, page.title)] = page
+        new = []
+        updated = 0
+        for record in records:
+            category_id = category_ids.get(record['category'])
+            if category_id is None:
+                logger.warning("Skipped page %r, its category %r was skipped",
+                               record['title'], record['category'])
+                skipped += 1
+                continue
+            views = int(record.get('views') or 0)
+            page = existing.get((category_id, record['title']))
+            if page is None:
+                new.append(Page(category_id=category_id, title=record['title'],
+                                url=record['url'], views=views))
+            elif (page.url, page.views) != (record['url'], views):
+                Page.objects.filter(id=page.id).update(url=record['url'], views=views)
+                updated += 1
+        Page.objects.bulk_create(new)
+        return len(new), updated, skipped
@@ -0,0 +1,288 @@
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from django.conf import settings
+
+from rango.timing import timed
+
+logger = logging.getLogger(__name__)
+
+
+# CASA API HELPERS
+
+CASA_BASE_URL = "https://preprod.mobile.trycasa.com/v1"
+
+
+def get_client_id():
+    url = CASA_BASE_URL + "/clients/client-ids"
+    return send_request(url, {}, {})
+
+
+def get_auth_token(extra_headers):
+    url = CASA_BASE_URL + "/clients/auth-tokens"
+    return send_request(url, {}, extra_headers)
+
+
+def login_to_casa_app(extra_headers, json_body):
+    url = CASA_BASE_URL + "/customers/login"
+    return send_request(url, json_body, extra_headers)
+
+
+def logout_of_casa(extra_headers, json_body):
+    url = CASA_BASE_URL + "/customers/logout"
+    return send_request(url, json_body, extra_headers)
+
+
+# HTTP SESSION
+# One long-lived session per process so every CASA call reuses pooled
+# keep-alive connections instead of paying a new TCP + TLS handshake.
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def build_session():
+    # Only failed connection attempts are retried: the request never
+    # reached CASA, so retrying a login or logout POST is still safe.
+    retries = getattr(settings, 'CASA_MAX_RETRIES', 2)
+    retry = Retry(total=retries, connect=retries, read=False, status=False,
+                  backoff_factor=getattr(settings, 'CASA_RETRY_BACKOFF', 0.2))
+    pool_size = getattr(settings, 'CASA_POOL_SIZE', 10)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                          max_retries=retry)
+    session = requests.Session()
+    session.verify = False
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_timeout():
+    return (getattr(settings, 'CASA_CONNECT_TIMEOUT', 3.05),
+            getattr(settings, 'CASA_READ_TIMEOUT', 10))
+
+
+def send_request(url, json_body, extra_headers):
+    # Fail fast while CASA is known to be down instead of queueing every
+    # request behind a connection timeout.
+    if not circuit_breaker.allow_request():
+        raise CircuitOpenError("CASA circuit is open, not calling " + url)
+
+    headers = get_headers()
+    if extra_headers:
+        headers.update(extra_headers)
+    try:
+        with timed('casa'):
+            response = get_session().post(url, json=json_body, headers=headers,
+                                          timeout=get_timeout())
+    except requests.RequestException:
+        circuit_breaker.record_failure()
+        raise
+    if response.status_code >= 500:
+        circuit_breaker.record_failure()
+    else:
+        circuit_breaker.record_success()
+
+    if response:
+        response = response.json()
+    return response
+
+
+def get_headers():
+    headers = {"X-Api-Username": "Api-Username",
+               "X-Api-Password": "Api-Password",
+               "X-Device-Id": "deviceId",
+               "X-App-Version": "1.80",
+               "organizationID": "",
+               "projectID": "",
+               "appID": ""}
+    return headers
+
+
+# CIRCUIT BREAKER
+# Closed: calls go through and consecutive failures are counted.
+# Open: calls fail immediately until reset_timeout has passed.
+# Half open: a single probe call is let through, its outcome decides
+# whether the circuit closes again or goes back to open.
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+class CircuitBreaker(object):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        # Number of times the breaker entered each state, for monitoring
+        self.state_changes = {self.CLOSED: 0, self.OPEN: 0, self.HALF_OPEN: 0}
+        self._lock = threading.Lock()
+        self._probe_in_flight = False
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    return False
+                self._change_state(self.HALF_OPEN)
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != self.CLOSED:
+                self._change_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+                if self.state != self.OPEN:
+                    self._change_state(self.OPEN)
+
+    def _change_state(self, state):
+        logger.warning("CASA circuit breaker %s -> %s", self.state, state)
+        self.state = state
+        self.state_changes[state] += 1
+
+    def render(self):
+        # Prometheus text format lines, for the metrics view
+        lines = ['# HELP rango_casa_breaker_transitions_total '
+                 'Times the CASA circuit breaker entered each state.',
+                 '# TYPE rango_casa_breaker_transitions_total counter']
+        with self._lock:
+            for state, count in sorted(self.state_changes.items()):
+                lines.append('rango_casa_breaker_transitions_total{{state="{0}"}} {1}'.format(
+                    state, count))
+            lines.extend(['# HELP rango_casa_breaker_state '
+                          'The CASA circuit breaker state, 1 for the current one.',
+                          '# TYPE rango_casa_breaker_state gauge'])
+            for state in sorted(self.state_changes):
+                lines.append('rango_casa_breaker_state{{state="{0}"}} {1}'.format(
+                    state, int(state == self.state)))
+        return lines
+
+
+circuit_breaker = CircuitBreaker(
+    failure_threshold=getattr(settings, 'CASA_BREAKER_FAILURE_THRESHOLD', 5),
+    reset_timeout=getattr(settings, 'CASA_BREAKER_RESET_TIMEOUT', 30))
+
+
+def fetch_credentials():
+    # A client id is needed before CASA will hand out an auth token,
+    # so the two calls always go together.
+    try:
+        client_id_response = get_client_id()
+        if not client_id_response:
+            return None
+        client_id = str(client_id_response["id"])
+
+        auth_token_response = get_auth_token({'X-Client-Id': client_id})
+        if not auth_token_response:
+            return None
+    except requests.RequestException:
+        return None
+    return {'client_id': client_id,
+            'authToken': auth_token_response["authToken"]}
+
+
+# TOKEN STORE
+# The client id and auth token are not tied to a visitor, so one pair is
+# shared by every session in the process instead of being fetched again
+# for each new session. A failed fetch keeps the last known pair, so
+# while CASA is down visitors are served with that stale token.
+
+class TokenStore(object):
+    def __init__(self, fetch, ttl, refresh_margin, wait_timeout):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._in_flight = None
+        self._credentials = None
+        self._expires_at = 0
+
+    def get(self, block=True):
+        now = time.time()
+        credentials = self._credentials
+        if credentials and now < self._expires_at:
+            # Still valid, but close to expiry: refresh in the background
+            # so no request ever has to wait for the upstream calls.
+            if now >= self._expires_at - self.refresh_margin:
+                self._start_fetch(background=True)
+            return credentials
+        # With block=False a cold store starts the fetch in the background
+        # and returns None straight away, leaving the worker free.
+        return self._start_fetch(background=not block)
+
+    def invalidate(self):
+        with self._lock:
+            self._credentials = None
+            self._expires_at = 0
+
+    def _start_fetch(self, background):
+        # Single flight: only the first caller talks to CASA, everybody
+        # arriving while that fetch is running waits for its result.
+        with self._lock:
+            in_flight = self._in_flight
+            leader = in_flight is None
+            if leader:
+                in_flight = self._in_flight = threading.Event()
+
+        if leader:
+            if background:
+                thread = threading.Thread(target=self._run_fetch,
+                                          args=(in_flight,))
+                thread.daemon = True
+                thread.start()
+            else:
+                self._run_fetch(in_flight)
+        elif not background:
+            in_flight.wait(self.wait_timeout)
+        return self._credentials
+
+    def _run_fetch(self, in_flight):
+        try:
+            credentials = self.fetch()
+            if credentials:
+                with self._lock:
+                    self._credentials = credentials
+                    self._expires_at = time.time() + self.ttl
+        finally:
+            with self._lock:
+                self._in_flight = None
+            in_flight.set()
+
+
+token_store = TokenStore(fetch_credentials,
+                         ttl=getattr(settings, 'CASA_TOKEN_TTL', 3600),
+                         refresh_margin=getattr(settings, 'CASA_TOKEN_REFRESH_MARGIN', 300),
+                         wait_timeout=getattr(settings, 'CASA_TOKEN_WAIT_TIMEOUT', 10))
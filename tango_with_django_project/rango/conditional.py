@@ -0,0 +1,89 @@
+import datetime
+import hashlib
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rango.models import Category, Page
+from rango.resolver import get_category
+from rango.signals import bulk_imported
+from rango.stamps import bump, get_stamp
+from rango.view_counter import views_flushed
+
+
+# CONDITIONAL GET
+# The category page's ETag and Last-Modified come from two version stamps,
+# see rango/stamps.py, so a revalidation is answered with 304 Not Modified
+# without running the page queries or rendering the template:
+#   - one for all categories, moved on by any category change, as the
+#     sidebar lists them all,
+#   - one per category, moved on when its pages, their order by views or
+#     its likes change.
+# Last-Modified is the time of the latest of them.
+#
+# Pages show the user's name and buttons, so the ETag includes who the
+# user is and logged in users get no Last-Modified.
+# A revalidation answered with 304 doesn't count as a category view.
+
+CATEGORIES_KEY = 'rango:stamp:categories'
+
+
+def category_key(category_id):
+    return 'rango:stamp:category:{0}'.format(category_id)
+
+
+def make_etag(*parts):
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def user_key(request):
+    user = request.user
+    return user.pk if user.is_authenticated() else None
+
+
+def category_stamps(category_name_slug):
+    category = get_category(category_name_slug)
+    if category is None:
+        return None
+    return get_stamp(CATEGORIES_KEY), get_stamp(category_key(category.id))
+
+
+def category_etag(request, category_name_slug):
+    stamps = category_stamps(category_name_slug)
+    if stamps is None:
+        return None
+    return make_etag(stamps, user_key(request), request.GET.get('cursor'))
+
+
+def category_last_modified(request, category_name_slug):
+    stamps = category_stamps(category_name_slug)
+    if stamps is None or user_key(request) is not None:
+        return None
+    return datetime.datetime.utcfromtimestamp(max(stamps))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump(CATEGORIES_KEY)
+    bump(category_key(instance.id))
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def page_changed(sender, instance, **kwargs):
+    bump(category_key(instance.category_id))
+
+
+@receiver(views_flushed, sender=Page)
+def page_views_flushed(sender, pks, **kwargs):
+    # The pages may have changed order
+    category_ids = Page.objects.filter(pk__in=pks).values_list('category_id', flat=True).distinct()
+    for category_id in category_ids:
+        bump(category_key(category_id))
+
+
+@receiver(bulk_imported)
+def objects_imported(sender, **kwargs):
+    # All category pages have a stamp older than this one
+    bump(CATEGORIES_KEY)
@@ -0,0 +1,99 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+
+# DATABASE PROFILES
+# settings.py picks the databases from the environment, see RANGO_DB
+# there. This module tunes SQLite connections and routes reads to the
+# replica, when there is one.
+
+def replica_alias():
+    # None unless a replica is configured
+    alias = getattr(settings, 'RANGO_REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@receiver(post_migrate)
+def enable_wal(sender, using, **kwargs):
+    # journal_mode=WAL persists in the database file, so it is set once
+    # here instead of on every connection
+    connection = connections[using]
+    if sender.name != 'rango' or connection.vendor != 'sqlite' or using == replica_alias():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode = WAL')
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma in getattr(settings, 'RANGO_SQLITE_PRAGMAS', []):
+            cursor.execute('PRAGMA ' + pragma)
+        if connection.alias == replica_alias():
+            # A write sent to the replica by mistake fails loudly
+            cursor.execute('PRAGMA query_only = ON')
+
+
+# READ REPLICA
+# Only code run under replica_reads(), like the read_from_replica views,
+# reads from the replica. Everything else, and every write, goes to the
+# primary. Once a request has written something, its reads stay on the
+# primary too, so it never misses its own write on a lagging replica:
+# add_page shows the category page with the page it just added.
+
+_local = threading.local()
+
+
+@contextmanager
+def replica_reads():
+    previous = getattr(_local, 'replica', False)
+    _local.replica = True
+    try:
+        yield
+    finally:
+        _local.replica = previous
+
+
+def read_from_replica(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+@receiver(request_started)
+def reset_writes(sender, **kwargs):
+    _local.wrote = False
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        if getattr(_local, 'replica', False) and not getattr(_local, 'wrote', False):
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Also for objects read from the replica
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its tables from the primary
+        if db == replica_alias():
+            return False
+        return None
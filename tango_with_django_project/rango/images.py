@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+# PROFILE PICTURES
+# An upload is streamed to disk chunk by chunk while it is hashed, and
+# stored under its content hash: profile_images/<hash>.<ext>. The same
+# picture uploaded twice is stored once, and a name never changes
+# content, so the media view lets browsers cache it for good.
+#
+# Thumbnails at RANGO_THUMBNAIL_SIZES are made by a small thread pool
+# after the request, next to the original as <hash>-<size>.jpg (or .png
+# for pictures with transparency). Until one exists thumbnail_url()
+# returns the original's URL.
+
+UPLOAD_DIR = 'profile_images'
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'RANGO_THUMBNAIL_WORKERS', 2))
+    return _executor
+
+
+def save_picture(profile, upload):
+    # Stores the upload and sets profile.picture to it, without saving
+    # the profile. Returns the future of the thumbnails. Raises
+    # ValidationError, and stores nothing, if the upload is no picture.
+    directory = os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in upload.chunks():
+                digest.update(chunk)
+                f.write(chunk)
+        # Named after what the file is, not what the client called it.
+        # Only the header is read.
+        try:
+            with Image.open(temp_path) as image:
+                extension = EXTENSIONS.get(image.format, '.img')
+        except (IOError, SyntaxError):
+            raise ValidationError("Upload a valid image.", code='invalid_image')
+        name = '{0}/{1}{2}'.format(UPLOAD_DIR, digest.hexdigest()[:32], extension)
+        # Atomic, a name is never seen half written
+        os.replace(temp_path, os.path.join(settings.MEDIA_ROOT, name))
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    # A name, not the upload, so saving the profile doesn't store it again
+    profile.picture = name
+    return get_executor().submit(make_thumbnails, name)
+
+
+def thumbnail_name(name, size, transparent=False):
+    base = os.path.splitext(name)[0]
+    return '{0}-{1}.{2}'.format(base, size, 'png' if transparent else 'jpg')
+
+
+def make_thumbnails(name):
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    sizes = sorted(getattr(settings, 'RANGO_THUMBNAIL_SIZES', [64, 128, 256]), reverse=True)
+    made = []
+    try:
+        with Image.open(path) as original:
+            # JPEGs can be decoded at a fraction of their size, much faster
+            original.draft('RGB', (sizes[0], sizes[0]))
+            transparent = original.mode in ('RGBA', 'LA') or 'transparency' in original.info
+            image = original.convert('RGBA' if transparent else 'RGB')
+        # Largest first, each one is shrunk from the previous
+        for size in sizes:
+            image.thumbnail((size, size), Image.LANCZOS)
+            thumbnail = thumbnail_name(name, size, transparent)
+            thumbnail_path = os.path.join(settings.MEDIA_ROOT, thumbnail)
+            temp_path = thumbnail_path + '.tmp'
+            image.save(temp_path, 'PNG' if transparent else 'JPEG', quality=85, optimize=True)
+            os.replace(temp_path, thumbnail_path)
+            made.append(thumbnail)
+    except Exception:
+        logger.exception("Could not make thumbnails of %s", name)
+        raise
+    return made
+
+
+def thumbnail_url(picture, size):
+    # URL of the picture's thumbnail of the given size, or of the
+    # picture itself while there is none
+    if not picture:
+        return ''
+    for transparent in (False, True):
+        name = thumbnail_name(picture.name, size, transparent)
+        if os.path.exists(os.path.join(settings.MEDIA_ROOT, name)):
+            return settings.MEDIA_URL + name
+    return picture.url
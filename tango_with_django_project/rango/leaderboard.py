@@ -0,0 +1,188 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rango.models import Category, Page
+from rango.signals import bulk_imported
+from rango.view_counter import views_flushed
+
+
+# LEADERBOARD
+# The most liked categories and most viewed pages shown on the index page
+# are kept in the cache as short, already sorted lists, so index reads
+# them with one cache lookup instead of sorting the tables on every hit.
+#
+# Likes and views only ever go up, so a bounded top list can be kept
+# exact by merging in each changed object. Anything that can push an
+# object down (a delete, an edit that lowers a count) drops the cached
+# list and it is rebuilt from the database on the next read.
+#
+# The lists live in the shared default cache, so a change made in one
+# process reaches the others. They also expire after
+# RANGO_LEADERBOARD_TIMEOUT seconds, which bounds how long a change no
+# signal reported, or a merge lost to a concurrent one in another
+# process, stays on the board.
+
+CATEGORIES_KEY = 'rango:leaderboard:categories'
+PAGES_KEY = 'rango:leaderboard:pages'
+
+CATEGORY_FIELDS = ('id', 'name', 'slug', 'likes')
+PAGE_FIELDS = ('id', 'title', 'url', 'views')
+
+# Read-merge-write of a list in the cache is not atomic, serialize it
+# within the process. Across processes the timeout catches up.
+_lock = threading.RLock()
+
+
+def get_size():
+    return getattr(settings, 'RANGO_LEADERBOARD_SIZE', 5)
+
+
+def get_timeout():
+    return getattr(settings, 'RANGO_LEADERBOARD_TIMEOUT', 60)
+
+
+def get_top_categories():
+    top = cache.get(CATEGORIES_KEY)
+    if top is None:
+        top = rebuild_categories()
+    return top
+
+
+def get_top_pages():
+    top = cache.get(PAGES_KEY)
+    if top is None:
+        top = rebuild_pages()
+    return top
+
+
+# Ties go to the newest, by -id: a backward scan of the likes or views
+# index yields that order, with no sort step.
+
+def top_categories_query():
+    return Category.objects.order_by('-likes', '-id').values(*CATEGORY_FIELDS)[:get_size()]
+
+
+def top_pages_query():
+    return Page.objects.order_by('-views', '-id').values(*PAGE_FIELDS)[:get_size()]
+
+
+def rebuild_categories():
+    top = list(top_categories_query())
+    cache.set(CATEGORIES_KEY, top, get_timeout())
+    return top
+
+
+def rebuild_pages():
+    top = list(top_pages_query())
+    cache.set(PAGES_KEY, top, get_timeout())
+    return top
+
+
+def rebuild():
+    return rebuild_categories(), rebuild_pages()
+
+
+def update_category(category):
+    merge(CATEGORIES_KEY, 'likes', row_for(category, CATEGORY_FIELDS))
+
+
+def update_category_likes(category_id, likes):
+    # Called after an UPDATE that only returned the new count, the rest of
+    # the row is only read if the category is new on the board.
+    with _lock:
+        top = cache.get(CATEGORIES_KEY)
+        if top is None:
+            return
+        current = [r for r in top if r['id'] == category_id]
+        if current:
+            row = dict(current[0], likes=likes)
+        elif makes_the_board(top, 'likes', likes, category_id):
+            try:
+                row = Category.objects.values(*CATEGORY_FIELDS).get(id=category_id)
+            except Category.DoesNotExist:
+                return
+        else:
+            return
+        merge(CATEGORIES_KEY, 'likes', row)
+
+
+def update_pages(pages):
+    for page in pages:
+        merge(PAGES_KEY, 'views', row_for(page, PAGE_FIELDS))
+
+
+def remove(key, pk):
+    with _lock:
+        top = cache.get(key)
+        if top is not None and any(row['id'] == pk for row in top):
+            cache.delete(key)
+
+
+def row_for(obj, fields):
+    if isinstance(obj, dict):
+        return dict((field, obj[field]) for field in fields)
+    return dict((field, getattr(obj, field)) for field in fields)
+
+
+def merge(key, score, row):
+    with _lock:
+        top = cache.get(key)
+        if top is None:
+            # Nothing cached, the next read rebuilds the whole list anyway
+            return
+        current = [r for r in top if r['id'] == row['id']]
+        if current and row[score] < current[0][score]:
+            # The object went down, we no longer know who takes its place
+            cache.delete(key)
+            return
+        if not current and not makes_the_board(top, score, row[score], row['id']):
+            return
+        top = [r for r in top if r['id'] != row['id']] + [row]
+        top.sort(key=lambda r: (-r[score], -r['id']))
+        cache.set(key, top[:get_size()], get_timeout())
+
+
+def makes_the_board(top, score, value, pk):
+    if len(top) < get_size():
+        return True
+    last = top[-1]
+    return (value, pk) > (last[score], last['id'])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    update_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    remove(CATEGORIES_KEY, instance.id)
+    # Its pages went with it
+    cache.delete(PAGES_KEY)
+
+
+@receiver(post_save, sender=Page)
+def page_saved(sender, instance, **kwargs):
+    update_pages([instance])
+
+
+@receiver(post_delete, sender=Page)
+def page_deleted(sender, instance, **kwargs):
+    remove(PAGES_KEY, instance.id)
+
+
+@receiver(views_flushed, sender=Page)
+def page_views_flushed(sender, pks, **kwargs):
+    update_pages(Page.objects.filter(pk__in=pks).values(*PAGE_FIELDS))
+
+
+@receiver(bulk_imported)
+def objects_imported(sender, **kwargs):
+    # Counts may have gone down, rebuild both lists on the next read
+    with _lock:
+        cache.delete(CATEGORIES_KEY)
+        cache.delete(PAGES_KEY)
@@ -0,0 +1,46 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+
+
+# Logging for rango is configured once, through LOGGING in settings.py.
+# Records are put on an in-memory queue and written to the console by a
+# background listener thread, so a request never blocks on log I/O.
+
+_trace = threading.local()
+
+
+def queue_handler(format=None):
+    # Used as a '()' factory in LOGGING
+    stream_handler = logging.StreamHandler()
+    if format:
+        stream_handler.setFormatter(logging.Formatter(format))
+    records = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(records, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return logging.handlers.QueueHandler(records)
+
+
+# PER-REQUEST DEBUG TRACE
+# DEBUG records are dropped unless the current request asked for a trace,
+# see RequestTraceMiddleware.
+
+def enable_trace():
+    _trace.enabled = True
+
+
+def disable_trace():
+    _trace.enabled = False
+
+
+def trace_enabled():
+    return getattr(_trace, 'enabled', False)
+
+
+class RequestTraceFilter(logging.Filter):
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or trace_enabled()
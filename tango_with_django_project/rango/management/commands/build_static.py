@@ -0,0 +1,16 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from rango import assets
+
+
+class Command(BaseCommand):
+    help = "Bundles and minifies the rango scripts, then collects all static files " \
+           "under content-hashed names, with gzip and brotli versions."
+
+    def handle(self, *args, **options):
+        for bundle, (before, after) in sorted(assets.build_bundles().items()):
+            self.stdout.write("{0}: {1} -> {2} bytes".format(bundle, before, after))
+        call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
+        if assets.brotli is None:
+            self.stdout.write("brotli is not installed, only gzip versions were written")
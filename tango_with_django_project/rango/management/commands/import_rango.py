@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rango.bulk_import import Importer
+
+
+# CSV columns, unused ones are left empty:
+#   type,name,category,title,url,views,likes
+# JSON lines hold the same keys, see rango.bulk_import.
+#
+# A running server sees the import without a restart: the leaderboards,
+# sidebar and page version stamps are in the shared default cache, which
+# this command updates, and what each server process keeps in memory
+# expires (RANGO_CATEGORY_CACHE_TIMEOUT, RANGO_SUGGEST_TIMEOUT,
+# RANGO_RESPONSE_CACHE_TIMEOUT).
+
+def read_jsonl(f):
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise CommandError("Line {0}: {1}".format(number, e))
+
+
+def read_csv(f):
+    for row in csv.DictReader(f):
+        yield dict((key, value) for key, value in row.items() if value != '')
+
+
+class Command(BaseCommand):
+    help = "Imports categories and pages from a JSON lines or CSV file. " \
+           "Existing rows are updated, so an import can be run again."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['jsonl', 'csv'],
+                            help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Batches written in parallel. SQLite serializes "
+                                 "writes, more than one only helps on PostgreSQL.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        reader = read_csv if format == 'csv' else read_jsonl
+        try:
+            f = io.open(path, encoding='utf-8', newline='')
+        except IOError as e:
+            raise CommandError(e)
+        with f:
+            importer = Importer(batch_size=options['batch_size'], workers=options['workers'])
+            importer.run(reader(f))
+        self.stdout.write("Imported {0} rows in {1:.1f}s ({2:.0f} rows/s): "
+                          "{3} created, {4} updated, {5} skipped".format(
+                              importer.rows, importer.elapsed, importer.rows_per_second(),
+                              importer.created, importer.updated, importer.skipped))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from rango import leaderboard
+
+
+class Command(BaseCommand):
+    # The leaderboards live in the shared default cache, so every process
+    # serves the rebuilt lists.
+    help = "Rebuilds the cached index page leaderboards from the database."
+
+    def handle(self, *args, **options):
+        categories, pages = leaderboard.rebuild()
+        self.stdout.write("Leaderboard rebuilt: {0} categories, {1} pages".format(
+            len(categories), len(pages)))
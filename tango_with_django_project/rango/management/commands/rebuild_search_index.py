@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rango import search
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index from the categories and pages."
+
+    def handle(self, *args, **options):
+        if not search.index_available():
+            raise CommandError("The search index needs an SQLite database.")
+        search.rebuild_index()
+        self.stdout.write("Search index rebuilt")
@@ -0,0 +1,25 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from rango.models import DailyVisits
+from rango.visits import visit_stats
+
+
+class Command(BaseCommand):
+    # Reads the per-day rows kept up to date by rango.visits, cheap
+    # enough to run from cron as often as needed.
+    help = "Prints site visits per day and totals for the last days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        last_day = datetime.datetime.utcnow().date()
+        first_day = last_day - datetime.timedelta(days=options['days'] - 1)
+        for row in DailyVisits.objects.filter(day__gte=first_day).order_by('day'):
+            self.stdout.write("{0}: {1} unique visitors, {2} new".format(
+                row.day, row.visits, row.new_visitors))
+        totals = visit_stats(first_day, last_day)
+        self.stdout.write("Last {0} days: {1} visits, {2} new visitors".format(
+            options['days'], totals['visits'], totals['new_visitors']))
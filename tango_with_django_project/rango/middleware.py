@@ -0,0 +1,72 @@
+import random
+
+from django.conf import settings
+from django.db import connections
+from rango.log import enable_trace, disable_trace
+from rango.timing import observe, server_timing, start_timing, stop_timing
+
+
+def is_staff(request):
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+def trace_requested(request):
+    # Outside of DEBUG mode only staff users can ask for a trace
+    return settings.RANGO_TRACE_PARAM in request.GET and (settings.DEBUG or is_staff(request))
+
+
+class RequestTraceMiddleware(object):
+    # Turns on DEBUG logging for a single request when it carries the
+    # RANGO_TRACE_PARAM query parameter, e.g. /rango/?_trace=1.
+    def process_request(self, request):
+        if trace_requested(request):
+            enable_trace()
+
+    def process_response(self, request, response):
+        disable_trace()
+        return response
+
+
+class RequestTimingMiddleware(object):
+    # Times a sample of the requests, see rango.timing. Goes first in
+    # MIDDLEWARE_CLASSES so the other middleware is part of the total.
+    # Requests left out of the sample only cost a random() call.
+    # The Server-Timing header tells how many queries a page runs and how
+    # long they take, so it only goes to staff users and traced requests,
+    # unless RANGO_TIMING_HEADER sends it to everyone.
+    def __init__(self):
+        self.sample_rate = getattr(settings, 'RANGO_TIMING_SAMPLE_RATE', 0)
+        self.header = getattr(settings, 'RANGO_TIMING_HEADER', False)
+
+    def process_request(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return
+        request._timing = start_timing()
+        # Have Django log the queries with their durations, like
+        # assertNumQueries does, on every database, the replica too, and
+        # remember where this request's start
+        request._timing_connections = []
+        for connection in connections.all():
+            request._timing_connections.append(
+                (connection, connection.force_debug_cursor, len(connection.queries_log)))
+            connection.force_debug_cursor = True
+
+    def process_response(self, request, response):
+        timing = getattr(request, '_timing', None)
+        if timing is None:
+            return response
+        stop_timing()
+        queries = []
+        for connection, debug_cursor, first_query in request._timing_connections:
+            queries.extend(list(connection.queries_log)[first_query:])
+            connection.force_debug_cursor = debug_cursor
+        timing.queries = len(queries)
+        timing.add('sql', sum(float(query['time']) for query in queries))
+
+        total = timing.total()
+        match = getattr(request, 'resolver_match', None)
+        observe(match.url_name if match and match.url_name else 'other', timing, total)
+        if self.header or is_staff(request) or trace_requested(request):
+            response['Server-Timing'] = server_timing(timing, total)
+        return response
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# The full-text index only exists on SQLite, see rango.search. The SQL is
+# written out here rather than taken from rango.search, so this migration
+# keeps doing what it did when rango.search changes.
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS rango_search USING fts5(title, url)")
+    # rowid 2 * id for a category, 2 * id + 1 for a page
+    schema_editor.execute("INSERT INTO rango_search (rowid, title, url) "
+                          "SELECT 2 * id, name, '' FROM rango_category")
+    schema_editor.execute("INSERT INTO rango_search (rowid, title, url) "
+                          "SELECT 2 * id + 1, title, url FROM rango_page")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS rango_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0008_hot_column_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
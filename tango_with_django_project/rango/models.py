@@ -1,4 +1,7 @@
-from django.db import models
+import sqlite3
+
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F
 from django.template.defaultfilters import slugify
 from django.contrib.auth.models import User
 
@@ -8,12 +11,33 @@ from django.contrib.auth.models import User
 class Category(models.Model):
     name = models.CharField(max_length=128, unique=True)
     views = models.IntegerField(default=0)
-    likes = models.IntegerField(default=0)
+    # Indexed, the index page sorts by likes
+    likes = models.IntegerField(default=0, db_index=True)
     slug = models.SlugField(blank=True, unique=True)
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
-        super(Category, self).save(*args, *kwargs)
+        super(Category, self).save(*args, **kwargs)
+
+    @classmethod
+    def add_like(cls, category_id):
+        # Increment the likes in the database rather than reading the row,
+        # adding one and saving it back, which loses likes under concurrency.
+        # Returns the new number of likes, or None if there is no such category.
+        if connection_supports_returning():
+            # One statement does the increment and hands back the new count
+            with connection.cursor() as cursor:
+                cursor.execute('UPDATE {0} SET likes = likes + 1 WHERE id = %s '
+                               'RETURNING likes'.format(cls._meta.db_table),
+                               [category_id])
+                row = cursor.fetchone()
+            return row[0] if row else None
+
+        with transaction.atomic():
+            categories = cls.objects.filter(id=category_id)
+            if not categories.update(likes=F('likes') + 1):
+                return None
+            return categories.values_list('likes', flat=True)[0]
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -26,7 +50,12 @@ class Page(models.Model):
     category = models.ForeignKey(Category)
     title = models.CharField(max_length=128)
     url = models.URLField()
-    views = models.IntegerField(default=0)
+    # Indexed, the index page sorts by views
+    views = models.IntegerField(default=0, db_index=True)
+
+    class Meta:
+        # Pages of a category listed by views
+        index_together = [('category', 'views')]
 
     def __str__(self):
         return self.title
@@ -43,3 +72,37 @@ class UserProfile(models.Model):
     # Override the __unicode__ method to return something useful
     def __str__(self):
         return self.user.username
+
+
+class DailyVisits(models.Model):
+    # Site visits per day, see rango/visits.py. A visitor counts once per
+    # day, so visits is also the number of unique visitors that day.
+    day = models.DateField(unique=True)
+    visits = models.IntegerField(default=0)
+    new_visitors = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily visits"
+
+    @classmethod
+    def add_visits(cls, day, visits, new_visitors):
+        counts = {'visits': F('visits') + visits,
+                  'new_visitors': F('new_visitors') + new_visitors}
+        if cls.objects.filter(day=day).update(**counts):
+            return
+        try:
+            # First visits of the day
+            with transaction.atomic():
+                cls.objects.create(day=day, visits=visits, new_visitors=new_visitors)
+        except IntegrityError:
+            # Another process created the row first
+            cls.objects.filter(day=day).update(**counts)
+
+    def __str__(self):
+        return str(self.day)
+
+
+def connection_supports_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35)
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db.models import Q
+
+
+# KEYSET PAGINATION
+# The pages of a category are listed most viewed first, ordered by
+# (views, id). Instead of an OFFSET, the cursor holds the (views, id) of
+# the last page shown and the next batch starts right after it, so every
+# batch is a short range scan on the (category, views) index no matter
+# how deep into the category the user is.
+#
+# Categories, for the API, are listed the same way by id alone.
+
+def get_page_size():
+    return getattr(settings, 'RANGO_PAGES_PER_PAGE', 20)
+
+
+def make_cursor(page):
+    return '{0}_{1}'.format(page.views, page.id)
+
+
+def parse_cursor(cursor):
+    # Returns (views, id), or None for a missing or malformed cursor
+    try:
+        views, pk = cursor.split('_')
+        return int(views), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def pages_after(pages, cursor):
+    # The pages after the cursor, in order
+    pages = pages.order_by('-views', '-id')
+    position = parse_cursor(cursor)
+    if position:
+        views, pk = position
+        pages = pages.filter(Q(views__lt=views) | Q(views=views, id__lt=pk))
+    return pages
+
+
+def get_batch(objects, size, make_cursor):
+    # Returns one batch of the ordered objects and the cursor for the next
+    # batch, which is None when this is the last one.
+
+    # Fetch one extra row to find out whether there is a next batch
+    batch = list(objects[:size + 1])
+    if len(batch) > size:
+        batch = batch[:size]
+        return batch, make_cursor(batch[-1])
+    return batch, None
+
+
+def get_pages_after(pages, cursor, size=None):
+    return get_batch(pages_after(pages, cursor), size or get_page_size(), make_cursor)
+
+
+def make_id_cursor(obj):
+    return str(obj.id)
+
+
+def parse_id_cursor(cursor):
+    # Returns the id, or None for a missing or malformed cursor
+    try:
+        return int(cursor)
+    except (TypeError, ValueError):
+        return None
+
+
+def categories_after(categories, cursor):
+    # The categories after the cursor, in order
+    categories = categories.order_by('id')
+    pk = parse_id_cursor(cursor)
+    if pk is not None:
+        categories = categories.filter(id__gt=pk)
+    return categories
+
+
+def get_categories_after(categories, cursor, size=None):
+    return get_batch(categories_after(categories, cursor), size or get_page_size(),
+                     make_id_cursor)
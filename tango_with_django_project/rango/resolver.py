@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rango.models import Category
+from rango.signals import bulk_imported
+
+
+# CATEGORY RESOLVER
+# Maps category slugs to categories and to their URLs, remembering the
+# most recently used ones, so the views and templates don't go back to
+# the database or the URL resolver for the same slug over and over.
+
+class LRUCache(object):
+    # With a ttl, entries are also forgotten that many seconds after
+    # they were set
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and time.time() >= expires_at:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# Categories changed in another process, or by an import, are only
+# reported to this one's signal receivers by the expiry
+_categories = LRUCache(getattr(settings, 'RANGO_CATEGORY_CACHE_SIZE', 1024),
+                       ttl=getattr(settings, 'RANGO_CATEGORY_CACHE_TIMEOUT', 60))
+_urls = LRUCache(getattr(settings, 'RANGO_CATEGORY_CACHE_SIZE', 1024))
+
+
+def get_category(slug):
+    # Returns the category with the given slug, or None.
+    # Only id, name and slug are loaded: use it to identify a category,
+    # not to show its counters.
+    category = _categories.get(slug)
+    if category is None:
+        try:
+            category = Category.objects.only('id', 'name', 'slug').get(slug=slug)
+        except Category.DoesNotExist:
+            return None
+        _categories.set(slug, category)
+    return category
+
+
+def category_url(slug):
+    url = _urls.get(slug)
+    if url is None:
+        url = reverse('show_category', args=[slug])
+        _urls.set(slug, url)
+    return url
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(bulk_imported)
+def category_changed(sender, **kwargs):
+    # A rename changes the slug, forget everything rather than
+    # looking for the old one
+    _categories.clear()
@@ -0,0 +1,147 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, unquote_etag
+
+from rango.models import Category, Page
+from rango.signals import bulk_imported
+from rango.stamps import bump, get_stamp
+from rango.view_counter import views_flushed
+
+
+# RESPONSE CACHE
+# Views decorated with cache_anonymous serve anonymous GETs from whole
+# responses kept in the RANGO_RESPONSE_CACHE_ALIAS cache, keyed by the
+# URL and the auth state. Logged in users, CASA users and trace requests
+# always get the view itself. The decorator goes outermost, the stored
+# response keeps the ETag and Last-Modified the view was sent with, and
+# a revalidation against them is answered with 304.
+#
+# A response is fresh for RANGO_RESPONSE_CACHE_TIMEOUT seconds (0 turns
+# the cache off), and until a Category or Page changes, or page views are
+# flushed, which reorders the pages: the signals below move a version
+# stamp on, see rango/stamps.py, which makes every stored response stale.
+# like_category calls invalidate() itself. The responses may be kept per
+# process, the stamp is shared, so a change made in one process makes
+# the responses of all of them stale.
+#
+# A stale response is kept for RANGO_RESPONSE_CACHE_STALE_TIMEOUT more
+# seconds. The first request to find it stale takes a lock and runs the
+# view; requests arriving meanwhile get the stale response, instead of
+# all of them running the view at once. Only a URL with nothing stored
+# at all is computed by every request that asks for it.
+#
+# What a view does on every request, like counting a view, goes in
+# on_hit, which is called when the stored response is served instead.
+
+STAMP_KEY = 'rango:stamp:responses'
+LOCK_TIMEOUT = 10
+
+
+def get_cache():
+    return caches[getattr(settings, 'RANGO_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def invalidate():
+    bump(STAMP_KEY)
+
+
+def is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if settings.RANGO_TRACE_PARAM in request.GET:
+        return False
+    if request.user.is_authenticated() or request.session.get('user_id'):
+        return False
+    return True
+
+
+def response_key(request):
+    # Only anonymous responses are stored, the auth state is in the key
+    # so the other states can never be served one
+    url = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return 'rango:response:{0}:anonymous'.format(url)
+
+
+def store(key, response, stamp, timeout):
+    # Only complete, shared responses: no cookies, no errors
+    if (response.status_code != 200 or response.streaming or response.cookies
+            or 'private' in response.get('Cache-Control', '')):
+        return
+    stale_timeout = getattr(settings, 'RANGO_RESPONSE_CACHE_STALE_TIMEOUT', 60)
+    entry = (stamp, time.time() + timeout, response.content, list(response.items()))
+    get_cache().set(key, entry, timeout + stale_timeout)
+
+
+def make_response(request, entry):
+    stamp, expires, content, headers = entry
+    validators = dict(headers)
+    etag = validators.get('ETag')
+    last_modified = validators.get('Last-Modified')
+    response = get_conditional_response(
+        request, etag=unquote_etag(etag) if etag else None,
+        last_modified=parse_http_date_safe(last_modified) if last_modified else None)
+    if response is not None:
+        for header in ('ETag', 'Last-Modified'):
+            if header in validators:
+                response[header] = validators[header]
+        return response
+    response = HttpResponse(content)
+    for header, value in headers:
+        response[header] = value
+    return response
+
+
+def cache_anonymous(on_hit=None):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = getattr(settings, 'RANGO_RESPONSE_CACHE_TIMEOUT', 0)
+            if timeout <= 0 or not is_cacheable(request):
+                return view(request, *args, **kwargs)
+
+            responses = get_cache()
+            key = response_key(request)
+            stamp = get_stamp(STAMP_KEY)
+            entry = responses.get(key)
+            if entry is not None:
+                if entry[0] == stamp and time.time() < entry[1]:
+                    return served(request, entry, on_hit, args, kwargs)
+                if not responses.add(key + ':lock', True, LOCK_TIMEOUT):
+                    # Another request is already running the view
+                    return served(request, entry, on_hit, args, kwargs)
+                try:
+                    response = view(request, *args, **kwargs)
+                    store(key, response, stamp, timeout)
+                finally:
+                    responses.delete(key + ':lock')
+                return response
+
+            response = view(request, *args, **kwargs)
+            store(key, response, stamp, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def served(request, entry, on_hit, args, kwargs):
+    if on_hit is not None:
+        on_hit(request, *args, **kwargs)
+    return make_response(request, entry)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+@receiver(bulk_imported)
+@receiver(views_flushed, sender=Page)
+def objects_changed(sender, **kwargs):
+    invalidate()
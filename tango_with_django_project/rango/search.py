@@ -0,0 +1,169 @@
+import math
+import re
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rango.models import Category, Page
+from rango.resolver import category_url
+from rango.signals import bulk_imported
+
+
+# FULL-TEXT SEARCH
+# Category names and page titles and URLs are indexed in an SQLite FTS5
+# table, kept in step with the models by the signal receivers below.
+# Matches are ranked by bm25 relevance, boosted by the category's likes
+# or the page's views. Those counters change all the time, so they are
+# read from the model tables at query time instead of being indexed.
+#
+# Each entry's rowid encodes what it is, 2 * id for a category and
+# 2 * id + 1 for a page, so keeping an entry up to date is a rowid lookup.
+#
+# Databases other than SQLite fall back to a plain icontains search.
+
+TABLE = 'rango_search'
+CATEGORY = 0
+PAGE = 1
+
+
+def index_available():
+    return connection.vendor == 'sqlite'
+
+
+def create_index(cursor):
+    cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5(title, url)".format(TABLE))
+
+
+def make_rowid(kind, obj_id):
+    return 2 * obj_id + kind
+
+
+def rebuild_index():
+    with connection.cursor() as cursor:
+        create_index(cursor)
+        cursor.execute("DELETE FROM {0}".format(TABLE))
+        cursor.execute("INSERT INTO {0} (rowid, title, url) "
+                       "SELECT 2 * id + %s, name, '' FROM rango_category".format(TABLE), [CATEGORY])
+        cursor.execute("INSERT INTO {0} (rowid, title, url) "
+                       "SELECT 2 * id + %s, title, url FROM rango_page".format(TABLE), [PAGE])
+
+
+def index_object(kind, obj_id, title, url):
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT OR REPLACE INTO {0} (rowid, title, url) VALUES (%s, %s, %s)".format(TABLE),
+                       [make_rowid(kind, obj_id), title, url])
+
+
+def unindex_object(kind, obj_id):
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM {0} WHERE rowid = %s".format(TABLE),
+                       [make_rowid(kind, obj_id)])
+
+
+def make_match(query):
+    # Turn free text into an FTS5 query: every word must appear, and the
+    # last one may be unfinished. Quoting the words keeps FTS5 operators
+    # typed by the user from being interpreted.
+    words = re.findall(r'\w+', query.lower())
+    if not words:
+        return None
+    return ' '.join('"{0}"'.format(word) for word in words) + '*'
+
+
+def search(query, limit=None):
+    # Returns a list of result dicts, best first
+    limit = limit or getattr(settings, 'RANGO_SEARCH_RESULTS', 20)
+    match = make_match(query)
+    if not match:
+        return []
+    if not index_available():
+        return fallback_search(query, limit)
+
+    # Let FTS5 pick the most relevant candidates, then rerank those with
+    # the popularity boost.
+    candidates = limit * getattr(settings, 'RANGO_SEARCH_CANDIDATES_FACTOR', 5)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT rowid, bm25({0}) FROM {0} WHERE {0} MATCH %s "
+                       "ORDER BY rank LIMIT %s".format(TABLE), [match, candidates])
+        rows = cursor.fetchall()
+
+    relevance = dict(((rowid % 2, rowid // 2), -bm25) for rowid, bm25 in rows)
+    results = get_results(
+        [pk for kind, pk in relevance if kind == CATEGORY],
+        [pk for kind, pk in relevance if kind == PAGE])
+    for result in results:
+        result['score'] = boost(relevance[(result['kind'], result['id'])],
+                                result['popularity'])
+    results.sort(key=lambda r: -r['score'])
+    return results[:limit]
+
+
+def fallback_search(query, limit):
+    category_ids = Category.objects.filter(name__icontains=query) \
+        .order_by('-likes').values_list('id', flat=True)[:limit]
+    page_ids = Page.objects.filter(Q(title__icontains=query) | Q(url__icontains=query)) \
+        .order_by('-views').values_list('id', flat=True)[:limit]
+    results = get_results(list(category_ids), list(page_ids))
+    for result in results:
+        result['score'] = boost(1.0, result['popularity'])
+    results.sort(key=lambda r: -r['score'])
+    return results[:limit]
+
+
+def boost(relevance, popularity):
+    weight = getattr(settings, 'RANGO_SEARCH_POPULARITY_WEIGHT', 0.1)
+    return relevance * (1 + weight * math.log1p(max(popularity, 0)))
+
+
+def get_results(category_ids, page_ids):
+    results = []
+    for category in Category.objects.filter(id__in=category_ids).only('name', 'slug', 'likes'):
+        results.append({'kind': CATEGORY, 'id': category.id,
+                        'title': category.name,
+                        'url': category_url(category.slug),
+                        'category': None,
+                        'popularity': category.likes})
+    goto = reverse('goto')
+    pages = Page.objects.filter(id__in=page_ids).select_related('category') \
+        .only('title', 'views', 'category__name')
+    for page in pages:
+        results.append({'kind': PAGE, 'id': page.id,
+                        'title': page.title,
+                        'url': '{0}?page_id={1}'.format(goto, page.id),
+                        'category': page.category.name,
+                        'popularity': page.views})
+    return results
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    if index_available():
+        index_object(CATEGORY, instance.id, instance.name, '')
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    if index_available():
+        unindex_object(CATEGORY, instance.id)
+
+
+@receiver(post_save, sender=Page)
+def page_saved(sender, instance, **kwargs):
+    if index_available():
+        index_object(PAGE, instance.id, instance.title, instance.url)
+
+
+@receiver(post_delete, sender=Page)
+def page_deleted(sender, instance, **kwargs):
+    if index_available():
+        unindex_object(PAGE, instance.id)
+
+
+@receiver(bulk_imported)
+def objects_imported(sender, **kwargs):
+    if index_available():
+        rebuild_index()
@@ -0,0 +1,39 @@
+import copy
+
+from django.contrib.sessions.backends import cached_db
+
+
+# SESSION BACKEND
+# Sessions are stored in the django_session table and cached in the
+# cache named by SESSION_CACHE_ALIAS, so reading one is usually a cache
+# lookup rather than a SELECT. The table keeps them, and the users logged
+# in, across restarts, cache evictions and workers.
+#
+# Django saves a session whenever a key was assigned during the request,
+# even to the value it already had. Here the session is compared with a
+# copy of what it held when it was loaded, so a request that only writes
+# back what the session already held doesn't save it at all. Changing a
+# value in place and assigning it back still counts as a change.
+#
+# Signed cookies would also avoid the database, but everything stored in
+# them can be read by the client, and the session holds the CASA token.
+
+class SessionStore(cached_db.SessionStore):
+    _loaded = None
+
+    def load(self):
+        data = super(SessionStore, self).load()
+        self._loaded = (self.session_key, copy.deepcopy(data))
+        return data
+
+    @property
+    def modified(self):
+        if not self._modified or self._loaded is None:
+            return self._modified
+        session_key, data = self._loaded
+        # A new key (login, flush) always needs saving
+        return session_key != self.session_key or self._session_cache != data
+
+    @modified.setter
+    def modified(self, value):
+        self._modified = value
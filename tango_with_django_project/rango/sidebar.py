@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+
+from rango.db import replica_reads
+from rango.models import Category
+from rango.signals import bulk_imported
+from rango.stamps import bump, get_stamp
+
+
+# CATEGORY SIDEBAR
+# The rendered category list is cached once per active category. Every
+# cache key includes a version stamp, see rango/stamps.py, moving it on
+# at any category change invalidates all the cached variants at once.
+#
+# The lists also expire after
+# RANGO_SIDEBAR_TIMEOUT seconds, which bounds how long a change no
+# signal reported stays out of them.
+
+STAMP_KEY = 'rango:stamp:sidebar'
+
+
+def get_timeout():
+    return getattr(settings, 'RANGO_SIDEBAR_TIMEOUT', 300)
+
+
+def render_category_list(act_cat=None):
+    slug = act_cat.slug if act_cat else ''
+    key = 'rango:sidebar:{0}:{1}'.format(get_stamp(STAMP_KEY), slug)
+    html = cache.get(key)
+    if html is None:
+        with replica_reads():
+            html = render_to_string('rango/cats.html', {
+                'cats': Category.objects.only('name', 'slug'),
+                'act_cat': act_cat,
+            })
+        cache.set(key, html, get_timeout())
+    return html
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(bulk_imported)
+def category_changed(sender, **kwargs):
+    bump(STAMP_KEY)
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by rango.bulk_import once an import is done. bulk_create() and
+# update() don't send post_save, so everything derived from the models
+# listens to this one as well.
+bulk_imported = Signal()
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+
+
+# VERSION STAMPS
+# A stamp is the time the data it covers last changed. What is cached
+# from that data carries the stamp it was built under, in its key, its
+# ETag or its entry, and is stale as soon as the stamp moves on: one
+# cache write invalidates every variant, without finding them. The
+# sidebar, the response cache and the conditional GET validators use
+# them.
+#
+# A stamp evicted from the cache starts again at the current time, which
+# makes everything built under the old one stale too.
+#
+# Stamps are moved on by the process that changed the data, so they are
+# kept in the default cache, which must be shared by every process, see
+# CACHES in settings. With a per-process cache the other workers would
+# keep serving stale pages and answering 304 for changed ones:
+# check_shared_cache warns about it.
+
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_stamp(key):
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time(), None)
+        stamp = cache.get(key, time.time())
+    return stamp
+
+
+def bump(key):
+    cache.set(key, time.time(), None)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PER_PROCESS_CACHES:
+        return []
+    return [checks.Warning(
+        "The default cache is not shared between processes, so the other "
+        "workers serve stale pages and answer 304 Not Modified for changed ones.",
+        hint="Use FileBasedCache, memcached or Redis for the default cache.",
+        id='rango.W001',
+    )]
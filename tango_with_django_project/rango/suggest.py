@@ -0,0 +1,128 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.template.defaultfilters import slugify
+
+from rango.models import Category
+from rango.resolver import category_url
+from rango.signals import bulk_imported
+
+
+# CATEGORY SUGGESTIONS
+# All category names are kept in memory in one list, sorted without
+# regard to case, so the names starting with a prefix are found with a
+# binary search instead of a LIKE query per keystroke. Only the names are
+# stored, slugs are derived from them the same way Category.save() does.
+# The list is loaded on first use and kept up to date by the signal
+# receivers below. Those only hear about changes made in this process,
+# so the list is also loaded again RANGO_SUGGEST_TIMEOUT seconds later,
+# which picks up the other workers' changes and imports.
+
+class NameIndex(object):
+    def __init__(self, max_age=None):
+        self.names = None
+        self.max_age = max_age
+        self.loaded_at = 0
+        self._lock = threading.Lock()
+
+    def load(self, names):
+        with self._lock:
+            self.names = sorted(names, key=str.lower)
+            self.loaded_at = time.time()
+
+    def unload(self):
+        with self._lock:
+            self.names = None
+
+    def loaded(self):
+        if self.names is None:
+            return False
+        return self.max_age is None or time.time() - self.loaded_at < self.max_age
+
+    def _position(self, key):
+        # First position whose lower-cased name is not below key
+        names = self.names
+        low, high = 0, len(names)
+        while low < high:
+            middle = (low + high) // 2
+            if names[middle].lower() < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def starting_with(self, prefix, limit):
+        prefix = prefix.lower()
+        names = self.names
+        position = self._position(prefix)
+        matches = []
+        while position < len(names) and len(matches) < limit:
+            name = names[position]
+            if not name.lower().startswith(prefix):
+                break
+            matches.append(name)
+            position += 1
+        return matches
+
+    def add(self, name):
+        with self._lock:
+            if self.names is not None:
+                self.names.insert(self._position(name.lower()), name)
+
+    def remove(self, name):
+        with self._lock:
+            if self.names is None:
+                return
+            position = self._position(name.lower())
+            while position < len(self.names) and self.names[position].lower() == name.lower():
+                if self.names[position] == name:
+                    del self.names[position]
+                    return
+                position += 1
+
+
+name_index = NameIndex(max_age=getattr(settings, 'RANGO_SUGGEST_TIMEOUT', 300))
+_load_lock = threading.Lock()
+
+
+def suggest(prefix, limit=None):
+    limit = limit or getattr(settings, 'RANGO_SUGGESTIONS', 8)
+    if not name_index.loaded():
+        with _load_lock:
+            if not name_index.loaded():
+                name_index.load(Category.objects.values_list('name', flat=True).iterator())
+    return [{'name': name, 'url': category_url(slugify(name))}
+            for name in name_index.starting_with(prefix, limit)]
+
+
+@receiver(pre_save, sender=Category)
+def category_saving(sender, instance, **kwargs):
+    # Remember the old name, a rename has to take it out of the index
+    instance._suggest_old_name = None
+    if instance.pk and name_index.loaded():
+        instance._suggest_old_name = Category.objects.filter(pk=instance.pk) \
+            .values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    old_name = getattr(instance, '_suggest_old_name', None)
+    if old_name == instance.name:
+        return
+    if old_name is not None:
+        name_index.remove(old_name)
+    name_index.add(instance.name)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    name_index.remove(instance.name)
+
+
+@receiver(bulk_imported)
+def categories_imported(sender, **kwargs):
+    # Loaded again on the next suggestion
+    name_index.unload()
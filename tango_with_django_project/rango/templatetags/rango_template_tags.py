@@ -1,10 +1,40 @@
 from django import template
-from rango.models import Category
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
+from rango.sidebar import render_category_list
+from rango.resolver import category_url as resolve_category_url
+from rango.images import thumbnail_url as resolve_thumbnail_url
 
 register = template.Library()
 
 
-@register.inclusion_tag('rango/cats.html')
+# The rendered list is cached, see rango.sidebar
+@register.simple_tag
 def get_category_list(cat=None):
-    return {'cats': Category.objects.all(),
-            'act_cat': cat}
+    return mark_safe(render_category_list(cat))
+
+
+# Same as {% url 'show_category' slug %}, remembering the URLs it built
+@register.simple_tag
+def category_url(slug):
+    return resolve_category_url(slug)
+
+
+# URL of a profile picture's thumbnail, e.g. {% thumbnail_url profile.picture 128 %}
+@register.simple_tag
+def thumbnail_url(picture, size):
+    return resolve_thumbnail_url(picture, size)
+
+
+# The bundle once "manage.py build_static" has made it, its scripts
+# one by one until then, see rango.assets
+@register.simple_tag
+def js_bundle(name):
+    if staticfiles_storage.exists(name):
+        sources = [name]
+    else:
+        sources = settings.RANGO_JS_BUNDLES[name]
+    return format_html_join('\n', '<script type="text/javascript" src="{0}"></script>',
+                            ((staticfiles_storage.url(source),) for source in sources))
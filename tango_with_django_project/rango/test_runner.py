@@ -0,0 +1,28 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    # Runs the tests on file caches of their own in a temporary directory,
+    # so clearing them never touches the cache the dev server reads, and
+    # nothing is left behind.
+    def setup_test_environment(self, **kwargs):
+        super(TestRunner, self).setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='rango-test-cache-')
+        caches = {}
+        for alias, cache in settings.CACHES.items():
+            if cache['BACKEND'].endswith('FileBasedCache'):
+                cache = dict(cache, LOCATION=os.path.join(self.cache_dir, alias))
+            caches[alias] = cache
+        self.caches = override_settings(CACHES=caches)
+        self.caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super(TestRunner, self).teardown_test_environment(**kwargs)
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.template.backends.django import DjangoTemplates
+
+
+# REQUEST TIMING
+# RequestTimingMiddleware starts a RequestTiming for a sample of the
+# requests. While one is running on the thread, the code below adds to it:
+#   sql     the queries Django logs for the request, see the middleware
+#   render  template rendering, through TimedDjangoTemplates
+#   casa    calls to CASA, see rango.casa.send_request
+# Measurements overlap, a query made while rendering counts for both.
+# Work done on other threads, like the background CASA token fetch, is
+# not part of the request and isn't counted.
+#
+# The timings go out in the response's Server-Timing header and into the
+# histograms below, which the metrics view exposes in the Prometheus text
+# format. The histograms are per process.
+
+_local = threading.local()
+
+
+class RequestTiming(object):
+    def __init__(self):
+        self.start = time.time()
+        self.durations = Counter()
+        self.queries = 0
+        self._running = set()
+
+    def add(self, name, seconds):
+        self.durations[name] += seconds
+
+    def total(self):
+        return time.time() - self.start
+
+
+def start_timing():
+    _local.timing = RequestTiming()
+    return _local.timing
+
+
+def stop_timing():
+    _local.timing = None
+
+
+def current_timing():
+    return getattr(_local, 'timing', None)
+
+
+@contextmanager
+def timed(name):
+    timing = current_timing()
+    # Nested calls, like the sidebar tag rendering its own template inside
+    # the page, are part of the outer measurement
+    if timing is None or name in timing._running:
+        yield
+        return
+    timing._running.add(name)
+    start = time.time()
+    try:
+        yield
+    finally:
+        timing._running.discard(name)
+        timing.add(name, time.time() - start)
+
+
+def server_timing(timing, total):
+    # Value of the Server-Timing header, durations in milliseconds
+    metrics = ['total;dur={0:.1f}'.format(total * 1000),
+               'sql;dur={0:.1f};desc="{1} queries"'.format(
+                   timing.durations['sql'] * 1000, timing.queries)]
+    for name in ('render', 'casa'):
+        if name in timing.durations:
+            metrics.append('{0};dur={1:.1f}'.format(name, timing.durations[name] * 1000))
+    return ', '.join(metrics)
+
+
+class TimedTemplate(object):
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timed('render'):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    # The Django template backend, timing every render
+    def from_string(self, template_code):
+        return TimedTemplate(super(TimedDjangoTemplates, self).from_string(template_code))
+
+    def get_template(self, template_name, *args, **kwargs):
+        return TimedTemplate(super(TimedDjangoTemplates, self).get_template(
+            template_name, *args, **kwargs))
+
+
+# HISTOGRAMS
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram(object):
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # view name -> [count per bucket, count, sum]
+        self._series = {}
+
+    def observe(self, view, value):
+        with self._lock:
+            series = self._series.get(view)
+            if series is None:
+                series = self._series[view] = [[0] * len(self.buckets), 0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = ['# HELP {0} {1}'.format(self.name, self.help),
+                 '# TYPE {0} histogram'.format(self.name)]
+        with self._lock:
+            for view, (buckets, count, total) in sorted(self._series.items()):
+                for bound, bucket in zip(self.buckets, buckets):
+                    lines.append('{0}_bucket{{view="{1}",le="{2}"}} {3}'.format(
+                        self.name, view, bound, bucket))
+                lines.append('{0}_bucket{{view="{1}",le="+Inf"}} {2}'.format(self.name, view, count))
+                lines.append('{0}_sum{{view="{1}"}} {2}'.format(self.name, view, total))
+                lines.append('{0}_count{{view="{1}"}} {2}'.format(self.name, view, count))
+        return lines
+
+
+request_duration = Histogram('rango_request_duration_seconds',
+                             "Time spent handling a request.", DURATION_BUCKETS)
+sql_duration = Histogram('rango_sql_duration_seconds',
+                         "Time spent in SQL queries per request.", DURATION_BUCKETS)
+sql_queries = Histogram('rango_sql_queries',
+                        "SQL queries per request.", QUERY_BUCKETS)
+render_duration = Histogram('rango_render_duration_seconds',
+                            "Time spent rendering templates per request.", DURATION_BUCKETS)
+casa_duration = Histogram('rango_casa_duration_seconds',
+                          "Time spent calling CASA per request.", DURATION_BUCKETS)
+HISTOGRAMS = [request_duration, sql_duration, sql_queries, render_duration, casa_duration]
+
+
+def observe(view, timing, total):
+    request_duration.observe(view, total)
+    sql_duration.observe(view, timing.durations['sql'])
+    sql_queries.observe(view, timing.queries)
+    render_duration.observe(view, timing.durations['render'])
+    casa_duration.observe(view, timing.durations['casa'])
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
@@ -1,5 +1,5 @@
 from django.conf.urls import url
-from rango import views
+from rango import api, views
 
 urlpatterns = [
     url(r'^$', views.index, name='index'),
@@ -9,9 +9,19 @@ urlpatterns = [
         views.add_page, name='add_page'),
     url(r'^category/(?P<category_name_slug>[\w\-]+)/$',
         views.show_category, name='show_category'),
+    url(r'^category/(?P<category_name_slug>[\w\-]+)/pages/$',
+        views.category_pages, name='category_pages'),
     # url(r'^register/$', views.register, name='register'),
     url(r'^login/$', views.user_login, name='login'),
     url(r'^logout/$', views.user_logout, name='logout'),
     url(r'^like/$', views.like_category, name='like_category'),
+    url(r'^goto/$', views.goto_url, name='goto'),
+    url(r'^search/$', views.search, name='search'),
+    url(r'^suggest/$', views.suggest_category, name='suggest'),
+    url(r'^metrics/$', views.metrics, name='metrics'),
+    url(r'^api/categories/$', api.category_list, name='api_categories'),
+    url(r'^api/batch/categories/$', api.category_batch, name='api_category_batch'),
+    url(r'^api/categories/(?P<category_name_slug>[\w\-]+)/pages/$',
+        api.category_page_list, name='api_category_pages'),
     url(r'^restricted/', views.restricted, name='restricted')
 ]
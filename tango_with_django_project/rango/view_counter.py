@@ -0,0 +1,140 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Sent once per model after a flush, with the primary keys that changed
+views_flushed = Signal(providing_args=['pks'])
+
+
+# BUFFERED VIEW COUNTING
+# Hits on categories and pages are counted in memory and written to the
+# database in batches by a background thread, instead of one UPDATE per
+# hit queueing on SQLite's write lock.
+#
+# RANGO_VIEW_FLUSH_INTERVAL: seconds between flushes. It is also the crash
+#     loss window: hits recorded since the last flush are lost if the
+#     process dies. None turns the background flusher off.
+# RANGO_VIEW_BUFFER_MAX_KEYS: memory bound. Once that many distinct
+#     categories and pages are waiting, the request that adds another one
+#     wakes the flusher up early. Without a flusher that request flushes
+#     the buffer itself.
+#
+# A failed flush puts the hits back for the next one and is logged, it
+# never turns a page view into an error.
+#
+# Counts are kept per key, (model, pk) here. A subclass can count other
+# things by overriding write() and written(), see rango/visits.py.
+
+class ViewBuffer(object):
+    # What is counted, for the logs
+    name = 'view counts'
+
+    def __init__(self, flush_interval, max_keys):
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._flusher = None
+        self._wake = threading.Event()
+
+    def record(self, *key):
+        with self._lock:
+            self._counts[key] += 1
+            full = len(self._counts) >= self.max_keys
+        self._start_flusher()
+        if not full:
+            return
+        if self._flusher is not None:
+            # Flush now, but on the flusher thread, not the request's
+            self._wake.set()
+        else:
+            self.flush_quietly()
+
+    def pending(self, *key):
+        with self._lock:
+            return self._counts.get(key, 0)
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return 0
+        try:
+            with transaction.atomic():
+                self.write(counts)
+        except Exception:
+            # Put the hits back so the next flush can try again
+            with self._lock:
+                self._counts.update(counts)
+            raise
+        self.written(counts)
+        return sum(counts.values())
+
+    def write(self, counts):
+        # Objects that got the same number of hits share one UPDATE
+        batches = {}
+        for (model, pk), hits in counts.items():
+            batches.setdefault((model, hits), []).append(pk)
+        for (model, hits), pks in batches.items():
+            model.objects.filter(pk__in=pks).update(views=F('views') + hits)
+
+    def written(self, counts):
+        changed = {}
+        for model, pk in counts:
+            changed.setdefault(model, []).append(pk)
+        for model, pks in changed.items():
+            views_flushed.send(sender=model, pks=pks)
+
+    def flush_quietly(self):
+        try:
+            return self.flush()
+        except Exception:
+            logger.exception("Could not flush %s", self.name)
+            return 0
+
+    def _start_flusher(self):
+        if self._flusher is not None or self.flush_interval is None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher)
+                self._flusher.daemon = True
+                self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush %s", self.name)
+                # However full the buffer is, give the database a whole
+                # interval before trying again
+                time.sleep(self.flush_interval)
+            finally:
+                # The flusher thread has its own connection, don't keep it open
+                connection.close()
+
+
+view_buffer = ViewBuffer(
+    flush_interval=getattr(settings, 'RANGO_VIEW_FLUSH_INTERVAL', 10),
+    max_keys=getattr(settings, 'RANGO_VIEW_BUFFER_MAX_KEYS', 10000))
+
+
+# Write out what is left when the process shuts down cleanly
+atexit.register(view_buffer.flush_quietly)
+
+
+def record_view(obj):
+    # concrete_model, as .only() querysets hand out deferred subclasses
+    view_buffer.record(obj._meta.concrete_model, obj.pk)
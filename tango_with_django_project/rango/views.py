@@ -1,40 +1,79 @@
 from django.shortcuts import render
+from django.conf import settings
 from rango.models import Category, Page
 from django.contrib.auth import logout
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, Http404, JsonResponse
+from django.http import FileResponse, HttpResponseNotModified
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.db import transaction
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, urlquote
+from django.views.static import was_modified_since
+from django.views.decorators.http import condition, etag
 from django.core.urlresolvers import reverse
 from django.contrib.auth.decorators import login_required
 from rango.forms import CategoryForm, PageForm, UserForm, UserProfileForm
-from datetime import datetime
+from rango.casa import circuit_breaker, login_to_casa_app, token_store
+from rango.view_counter import record_view
+from rango import leaderboard
+from rango.pagination import get_pages_after
+from rango.resolver import get_category
+from rango import search as search_index
+from rango.suggest import suggest
+from rango import timing
+from rango.visits import record_visit
+from rango.db import read_from_replica
+from rango.images import UPLOAD_DIR, save_picture
+from rango import conditional
+from rango import sidebar
+from rango.stamps import bump, get_stamp
+from rango import response_cache
 import requests
 import logging
-import http.client as http_client
+import mimetypes
+import os
+
+logger = logging.getLogger(__name__)
 
 
 # Create your views here.
 
-def index(request):
-    # Query the database for a list of ALL categories currently stored
-    # Order the categories by no. likes in descending order.
-    # Retrieve the top 5 only - or all if less than 5.
-    # Place the list in a context dictionary.
-    # that will be passed to the template engine
+def index_etag(request):
+    # Everything the index page shows: the leaderboards, the sidebar,
+    # the user and the visits. Counting the visit here as well is fine,
+    # it only counts once a day.
+    return conditional.make_etag(
+        leaderboard.get_top_categories(), leaderboard.get_top_pages(),
+        get_stamp(sidebar.STAMP_KEY), conditional.user_key(request),
+        visitor_cookie_handler(request), request.session.get('user_first_name'))
 
-    # In the '-likes' parameter, the '-' stands for descending
-    # [:5] splits the list and takes the elements from 0 to 4
 
-    category_list = Category.objects.order_by('-likes')[:5]
-    page_list = Page.objects.order_by('-views')[:5]
+def count_visit(request):
+    # A cached index page still counts the visit
+    record_visit(request.session)
+
+
+@response_cache.cache_anonymous(on_hit=count_visit)
+@read_from_replica
+@etag(index_etag)
+def index(request):
+    # Get the top 5 categories by likes and the top 5 pages by views.
+    # Both lists are kept up to date in the cache by rango.leaderboard,
+    # so no table has to be sorted here.
+    # Place the lists in a context dictionary
+    # that will be passed to the template engine
+    category_list = leaderboard.get_top_categories()
+    page_list = leaderboard.get_top_pages()
     context_dict = {'categories': category_list, 'pages': page_list}
 
-    visitor_cookie_handler(request)
-    context_dict['visits'] = request.session['visits']
+    context_dict['visits'] = visitor_cookie_handler(request)
 
-    # Test : print client_id and auth_token
-    print("Client ID: " + str(request.session['client_id']))
-    print("Auth Token: " + str(request.session['authToken']))
+    # Test : log client_id and auth_token
+    logger.debug("Client ID: %s", request.session.get('client_id'))
+    logger.debug("Auth Token: %s", request.session.get('authToken'))
     if request.session.get("user_id"):
-        print("CASA UserID:" + str(request.session['user_id']))
+        logger.debug("CASA UserID: %s", request.session['user_id'])
         context_dict['casa_user'] = True
         context_dict['casa_user_name'] = str(request.session['user_first_name'])
 
@@ -45,41 +84,95 @@ def index(request):
     return response
 
 
+@response_cache.cache_anonymous()
 def about(request):
     return render(request, 'rango/about.html', {})
 
 
+def count_category_view(request, category_name_slug):
+    # A cached category page still counts the view
+    category = get_category(category_name_slug)
+    if category:
+        record_view(category)
+
+
+@response_cache.cache_anonymous(on_hit=count_category_view)
+@read_from_replica
+@condition(etag_func=conditional.category_etag,
+           last_modified_func=conditional.category_last_modified)
 def show_category(request, category_name_slug):
     # Create a context dictionary whidh we can pass
     # to the template rendering engine
     context_dict = {}
 
-    try:
-        # Can we find a category name slug with the given name?
-        # If we can't, the .get() method raises a DoesNotExist exception
-        # So the .get() method returns one model instance or raises an exception.
-        category = Category.objects.get(slug=category_name_slug)
-
-        # Retrieve all of the associated pages.
-        # Note that filter() will return a list of page objects or an empty list
-        pages = Page.objects.filter(category=category)
-
-        # Adds our results list to the template context under name pages.
-        context_dict['pages'] = pages
-        # We also add the category object from
-        # the database dictionary.
-        # We'll use this in the template to verify that the category exists
-        context_dict['category'] = category
-    except Category.DoesNotExist:
-
-        # We get here if we didn't find the specified category.
-        # Don't do anything - the template will display the "no category message" for us.
-        context_dict['category'] = None
-        context_dict['pages'] = None
+    # Retrieve the first batch of the category's pages, most viewed first,
+    # together with the category itself in a single joined query.
+    # The template loads the following batches from category_pages.
+    pages, next_cursor = get_pages_after(
+        Page.objects.filter(category__slug=category_name_slug).select_related('category'),
+        request.GET.get('cursor'))
+    if pages:
+        category = pages[0].category
+    else:
+        # No pages to take the category from, look it up on its own.
+        # first() returns None if there is no category with this slug.
+        category = Category.objects.filter(slug=category_name_slug).first()
+
+    # Adds our results list to the template context under name pages.
+    context_dict['pages'] = pages
+    context_dict['next_cursor'] = next_cursor
+    # We also add the category object from
+    # the database dictionary.
+    # We'll use this in the template to verify that the category exists
+    # If it doesn't, the template will display the "no category message" for us.
+    context_dict['category'] = category
+
+    if category:
+        # Count the visit, it is written to the database in the background
+        record_view(category)
 
     return render(request, 'rango/category.html', context_dict)
 
 
+def goto_url(request):
+    # Count a click on a page link, then send the user on to the page
+    try:
+        page = Page.objects.only('url').get(id=int(request.GET.get('page_id', '')))
+    except (ValueError, Page.DoesNotExist):
+        raise Http404("No such page")
+    record_view(page)
+    return HttpResponseRedirect(page.url)
+
+
+@read_from_replica
+def category_pages(request, category_name_slug):
+    # JSON version of one batch of a category's pages, for loading
+    # more pages into the category page without reloading it
+    pages, next_cursor = get_pages_after(
+        Page.objects.filter(category__slug=category_name_slug),
+        request.GET.get('cursor'))
+    goto = reverse('goto')
+    return JsonResponse({
+        'pages': [{'title': page.title,
+                   'url': '{0}?page_id={1}'.format(goto, page.id),
+                   'views': page.views} for page in pages],
+        'next_cursor': next_cursor,
+    })
+
+
+def search(request):
+    query = request.GET.get('query', '').strip()
+    results = search_index.search(query) if query else []
+    return render(request, 'rango/search.html', {'query': query, 'results': results})
+
+
+def suggest_category(request):
+    # Category names starting with what the user has typed so far
+    prefix = request.GET.get('q', '').strip()
+    suggestions = suggest(prefix) if prefix else []
+    return JsonResponse({'suggestions': suggestions})
+
+
 def add_category(request):
     form = CategoryForm()
 
@@ -98,17 +191,15 @@ def add_category(request):
             return index(request)
         else:
             # The supplied form contained errors -
-            # just print them to the terminal
-            print(form.errors)
+            # just log them
+            logger.debug("Invalid category form: %s", form.errors)
 
     return render(request, 'rango/add_category.html', {'form': form})
 
 
 def add_page(request, category_name_slug):
-    try:
-        category = Category.objects.get(slug=category_name_slug)
-    except Category.DoesNotExist:
-        category = None
+    # None if there is no such category
+    category = get_category(category_name_slug)
 
     form = PageForm()
     if request.method == 'POST':
@@ -121,7 +212,7 @@ def add_page(request, category_name_slug):
                 page.save()
                 return show_category(request, category_name_slug)
         else:
-            print(form.errors)
+            logger.debug("Invalid page form: %s", form.errors)
 
     context_dict = {'form': form, 'category': category}
     return render(request, 'rango/add_page.html', context_dict)
@@ -138,44 +229,53 @@ def register(request):
     if request.method == 'POST':
         # Attempt to grab information from the raw form information.
         # Note that we make use of both UserForm and UserProfileForm
+        # The picture is checked to be an image by the form
         user_form = UserForm(data=request.POST)
-        profile_form = UserProfileForm(data=request.POST)
+        profile_form = UserProfileForm(data=request.POST, files=request.FILES)
 
         # If the two forms are valid ...
         if user_form.is_valid() and profile_form.is_valid():
-            # Save the user's form data to the database
-            user = user_form.save()
-
-            # Now we hash the password with the set_password method.
-            # Once hashed, we can update the user object
-            user.set_password(user.set_password)
-            user.save()
-
             # now sort out the UserProfile instance.
             # Since we need to set the user attribute ourselves,
             # we set commit=False. This delays saving the model
             # until we're ready to avoid integrity problems
             profile = profile_form.save(commit=False)
-            profile.user = user
-
-            # Did the user provide a profile picture?
-            # If so, we need to get it from the input form and
-            # put it in the UserProfile model
 
-            if 'picture' in request.FILES:
-                profile.picture = request.FILES['picture']
-
-            # Now we save the UserProfile model instance
-            profile.save()
-
-            # Update our variable to indicate that the template
-            # registration was successful
-            registered = True
+            try:
+                # The user and the profile, or neither
+                with transaction.atomic():
+                    # Save the user's form data to the database
+                    user = user_form.save()
+
+                    # Now we hash the password with the set_password method.
+                    # Once hashed, we can update the user object
+                    user.set_password(user.password)
+                    user.save()
+                    profile.user = user
+
+                    # Did the user provide a profile picture?
+                    # If so, we need to get it from the input form and
+                    # put it in the UserProfile model
+                    if 'picture' in request.FILES:
+                        # Stored under its content hash, thumbnails are made
+                        # in the background
+                        save_picture(profile, request.FILES['picture'])
+
+                    # Now we save the UserProfile model instance
+                    profile.save()
+
+                # Update our variable to indicate that the template
+                # registration was successful
+                registered = True
+            except ValidationError as e:
+                # Not a picture Pillow can read after all
+                profile_form.add_error('picture', e)
 
         else:
             # Invalid form or forms - mistakes or something else?
-            # Print problems to the terminal
-            print(user_form.errors, profile_form.errors)
+            # Log the problems
+            logger.debug("Invalid registration forms: %s %s",
+                         user_form.errors, profile_form.errors)
 
     else:
         # Not a HTTP POST, so we render our form using two ModelForm instances.
@@ -191,7 +291,6 @@ def register(request):
 
 #   USER_LOGIN VIEW
 def user_login(request):
-    set_debug_for_requests()
     # If the request is a POST request, try to pull out the relevant information.
     if request.method == 'POST':
         # Gather the username and password provided by the user.
@@ -209,13 +308,24 @@ def user_login(request):
         # user = authenticate(username=username, password=password)
 
         # We will use the CASA login for testing purposes
-        client_id = str(request.session['client_id'])
-        auth_token = str(request.session['authToken'])
+        # The pair copied into the session on the first visit is never
+        # renewed, take the shared store's current one, waiting for it
+        # if the store is cold.
+        credentials = token_store.get()
+        if not credentials:
+            return HttpResponse("CASA login is unavailable, please try again later.")
+        store_casa_credentials(request, credentials)
+
+        client_id = str(credentials['client_id'])
+        auth_token = str(credentials['authToken'])
 
         extra_headers = {'X-Client-Id': client_id, 'X-Auth-Token': auth_token}
         login_data = {'email': username, 'password': password}
 
-        login_response = login_to_casa_app(extra_headers, login_data)
+        try:
+            login_response = login_to_casa_app(extra_headers, login_data)
+        except requests.RequestException:
+            return HttpResponse("CASA login is unavailable, please try again later.")
 
         if 'id' in login_response:
             request.session['user_id'] = login_response['id']
@@ -269,56 +379,99 @@ def restricted(request):
     return HttpResponse("Since you're logged in, you can see this text")
 
 
+def media(request, path):
+    # Serves uploaded files, in place of the development static() view.
+    # With RANGO_MEDIA_ACCEL_REDIRECT set, nginx sends the file itself,
+    # otherwise FileResponse hands it to the server's wsgi.file_wrapper,
+    # which can use sendfile.
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("No such file")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("No such file")
+    if not os.path.isfile(full_path):
+        raise Http404("No such file")
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        return HttpResponseNotModified()
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    if settings.RANGO_MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.RANGO_MEDIA_ACCEL_REDIRECT + urlquote(path)
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response['Content-Length'] = stat.st_size
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if path.startswith(UPLOAD_DIR + '/'):
+        # Content-hashed names, see rango.images
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+def metrics_allowed(request):
+    # Staff users, or a scraper sending "Authorization: Bearer <token>"
+    # with RANGO_METRICS_TOKEN. Not the client address: behind nginx
+    # every request comes from 127.0.0.1.
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'RANGO_METRICS_TOKEN', None)
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(header, 'Bearer ' + token)
+
+
+def metrics(request):
+    # Request timing histograms and the CASA circuit breaker in the
+    # Prometheus text format
+    if not metrics_allowed(request):
+        raise Http404("No such page")
+    content = timing.render_metrics() + '\n'.join(circuit_breaker.render()) + '\n'
+    return HttpResponse(content, content_type='text/plain; version=0.0.4')
+
+
 @login_required
 def like_category(request):
     if request.method == 'GET':
-        cat_id = request.GET['category_id']
         likes = 0
-        if cat_id:
-            cat = Category.objects.get(id=int(cat_id))
-            if cat:
-                likes = cat.likes + 1
-                cat.likes = likes
-                cat.save()
+        try:
+            # Anything but a positive number likes nothing
+            cat_id = int(request.GET.get('category_id', ''))
+        except ValueError:
+            cat_id = None
+        if cat_id is not None and cat_id > 0:
+            likes = Category.add_like(cat_id) or 0
+            if likes:
+                leaderboard.update_category_likes(cat_id, likes)
+                bump(conditional.category_key(cat_id))
+                response_cache.invalidate()
         return HttpResponse(likes)
 
 
 # HELPER FUNCTIONS
 def visitor_cookie_handler(request):
-    # Get the number of visits to the site.
-    # We use the COOKIES.get() function to obtain the visits cookie.
-    # If the cookie exists, the value returned is casted to an integer.
-    # If the cookie doesn't exist, then the default value of 1 is used
-    visits = int(request.COOKIES.get('visits', '1'))
-
-    last_visit_cookie = request.COOKIES.get('last_visit', str(datetime.now()))
-    last_visit_time = datetime.strptime(last_visit_cookie[:-7], '%Y-%m-%d %H:%M:%S')
-
-    # If it's been more than a day since the last visit ...
-    if (datetime.now() - last_visit_time).days > 0:
-        visits += 1
-        # update the last visit cookie now that we have updated the count
-        request.session['last_visit'] = str(datetime.now())
-    else:
-        visits = 1
-        # set the last visit oookie
-        request.session['last_visit'] = last_visit_cookie
-
-    # Update/set the visits cookie
-    request.session['visits'] = visits
+    # Count the visit, see rango.visits. Returns the number of days
+    # this visitor has been to the site.
+    visits = record_visit(request.session)
 
     if not request.session.get('client_id'):
-        # Set the clientId cookie
-        client_id_response = get_client_id()
-        if client_id_response:
-            request.session['client_id'] = client_id_response["id"]
+        # Set the clientId and authToken cookies from the shared token store,
+        # CASA is only called when the process-wide pair is missing or stale.
+        # Unless CASA_BLOCKING_TOKEN_FETCH is set, a cold store is filled in
+        # the background and this visit is served without credentials.
+        credentials = token_store.get(block=settings.CASA_BLOCKING_TOKEN_FETCH)
+        store_casa_credentials(request, credentials)
+    return visits
 
-        client_id = str(request.session['client_id'])
 
-        extra_headers = {'X-Client-Id': client_id}
-        auth_token_response = get_auth_token(extra_headers)
-        if auth_token_response:
-            request.session['authToken'] = auth_token_response["authToken"]
+def store_casa_credentials(request, credentials):
+    if credentials:
+        request.session['client_id'] = credentials['client_id']
+        request.session['authToken'] = credentials['authToken']
 
 
 def get_server_side_cookie(request, cookie, default_val=None):
@@ -327,53 +480,3 @@ def get_server_side_cookie(request, cookie, default_val=None):
         val = default_val
     return val
 
-
-def get_client_id():
-    url = "https://preprod.mobile.trycasa.com/v1/clients/client-ids"
-    return send_request(url, {}, {})
-
-
-def get_auth_token(extra_headers):
-    url = "https://preprod.mobile.trycasa.com/v1/clients/auth-tokens"
-    return send_request(url, {}, extra_headers)
-
-
-def login_to_casa_app(extra_headers, json_body):
-    url = "https://preprod.mobile.trycasa.com/v1/customers/login"
-    return send_request(url, json_body, extra_headers)
-
-
-def logout_of_casa(extra_headers, json_body):
-    url = "https://preprod.mobile.trycasa.com/v1/customers/logout"
-    return send_request(url, json_body, extra_headers)
-
-
-def send_request(url, json_body, extra_headers):
-    headers = get_headers()
-    if extra_headers:
-        headers.update(extra_headers)
-    response = requests.post(url, verify=False, json=json_body, headers=headers)
-    if response:
-        response = response.json()
-    return response
-
-
-def get_headers():
-    headers = {"X-Api-Username": "Api-Username",
-               "X-Api-Password": "Api-Password",
-               "X-Device-Id": "deviceId",
-               "X-App-Version": "1.80",
-               "organizationID": "",
-               "projectID": "",
-               "appID": ""}
-    return headers
-
-
-# Function to set up request debugging
-def set_debug_for_requests():
-    http_client.HTTPConnection.debuglevel = 1
-    logging.basicConfig()
-    logging.getLogger().setLevel(logging.DEBUG)
-    log = logging.getLogger("requests.packages.urllib3")
-    log.setLevel(logging.DEBUG)
-    log.propagate = True
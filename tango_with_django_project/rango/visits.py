@@ -0,0 +1,77 @@
+import atexit
+import datetime
+import time
+
+from django.conf import settings
+from django.db.models import Sum
+
+from rango.models import DailyVisits
+from rango.view_counter import ViewBuffer
+
+
+# VISIT TRACKING
+# A visitor's record is one session key holding [visits, last visit],
+# the last visit in whole seconds since the epoch. A visit counts when it
+# falls on another (UTC) day than the last counted one. Within a day the
+# record is left alone, so the session has nothing new to save, see
+# rango/sessions.py.
+#
+# Counted visits are added to the DailyVisits row of their day. They go
+# through a write-behind buffer like the view counts, see
+# rango/view_counter.py, so a request never waits on that write, and a
+# flush adds up all the visits of a day in one. The rows are the
+# aggregates: visits is the number of unique visitors of the day,
+# new_visitors the first-timers among them.
+
+SESSION_KEY = 'visit'
+DAY = 24 * 60 * 60
+
+
+class VisitBuffer(ViewBuffer):
+    # Counts visits per (day, new visitor)
+    name = 'visits'
+
+    def write(self, counts):
+        days = {}
+        for (day, new_visitor), visits in counts.items():
+            totals = days.setdefault(day, [0, 0])
+            totals[0] += visits
+            if new_visitor:
+                totals[1] += visits
+        for day, (visits, new_visitors) in days.items():
+            DailyVisits.add_visits(day, visits, new_visitors)
+
+    def written(self, counts):
+        pass
+
+
+visit_buffer = VisitBuffer(
+    flush_interval=getattr(settings, 'RANGO_VIEW_FLUSH_INTERVAL', 10),
+    max_keys=getattr(settings, 'RANGO_VIEW_BUFFER_MAX_KEYS', 10000))
+
+atexit.register(visit_buffer.flush_quietly)
+
+
+def record_visit(session, now=None):
+    # Returns the number of days the visitor has been to the site
+    now = int(time.time() if now is None else now)
+    record = session.get(SESSION_KEY)
+    if record is None:
+        visits = 1
+    elif record[1] // DAY != now // DAY:
+        visits = record[0] + 1
+    else:
+        return record[0]
+    session[SESSION_KEY] = [visits, now]
+    visit_buffer.record(datetime.datetime.utcfromtimestamp(now).date(), record is None)
+    return visits
+
+
+def visit_stats(first_day, last_day):
+    # Totals over the days from first_day to last_day, both included, as
+    # of the last flush.
+    # new_visitors is also the number of unique visitors over the period
+    # who had never been to the site before it.
+    totals = DailyVisits.objects.filter(day__gte=first_day, day__lte=last_day) \
+        .aggregate(visits=Sum('visits'), new_visitors=Sum('new_visitors'))
+    return dict((key, value or 0) for key, value in totals.items())
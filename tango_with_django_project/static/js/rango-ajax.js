@@ -5,4 +5,28 @@ $('#likes').click(function(){
         $('#like_count').html(data);
         $('#likes').hide();
     })
-})
\ No newline at end of file
+})
+
+$('#more_pages').click(function(){
+    var button = $(this);
+    $.getJSON(button.attr("data-url"), {cursor: button.attr("data-cursor")}, function(data){
+        $.each(data.pages, function(i, page){
+            $('#pages').append($('<li>').append($('<a>').attr('href', page.url).text(page.title)));
+        });
+        if (data.next_cursor) {
+            button.attr("data-cursor", data.next_cursor);
+        } else {
+            button.hide();
+        }
+    })
+})
+
+$('#suggestion').keyup(function(){
+    var query = $(this).val();
+    $.getJSON($(this).attr("data-url"), {q: query}, function(data){
+        var list = $('#suggestions').empty();
+        $.each(data.suggestions, function(i, category){
+            list.append($('<li>').append($('<a>').attr('href', category.url).text(category.name)));
+        });
+    })
+})
@@ -16,6 +16,8 @@ import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 STATIC_DIR = os.path.join(BASE_DIR, 'static')
+# Bundles made by "manage.py build_static"
+BUILD_DIR = os.path.join(BASE_DIR, 'static_build')
 MEDIA_DIR = os.path.join(BASE_DIR, 'media')
 LOGIN_URL = 'rango/login/'
 
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    'rango.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,13 +58,15 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'rango.middleware.RequestTraceMiddleware',
 ]
 
 ROOT_URLCONF = 'tango_with_django_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django backend, also timing renders for rango.timing
+        'BACKEND': 'rango.timing.TimedDjangoTemplates',
         'DIRS': [TEMPLATE_DIR, ],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -76,7 +81,7 @@ TEMPLATES = [
     },
 ]
 
-STATICFILES_DIRS = [STATIC_DIR, ]
+STATICFILES_DIRS = [STATIC_DIR, BUILD_DIR, ]
 
 WSGI_APPLICATION = 'tango_with_django_project.wsgi.application'
 
@@ -84,13 +89,123 @@ WSGI_APPLICATION = 'tango_with_django_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.9/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# Picked from the environment:
+# RANGO_DB                  'sqlite' (default) or 'postgresql'
+# RANGO_DB_NAME             SQLite file, or PostgreSQL database name
+# RANGO_DB_USER, RANGO_DB_PASSWORD, RANGO_DB_HOST, RANGO_DB_PORT
+#                           PostgreSQL connection
+# RANGO_DB_CONN_MAX_AGE     seconds a connection is kept open between
+#                           requests, 0 closes it after each one
+# RANGO_DB_REPLICA_NAME     SQLite file of a read replica, or
+# RANGO_DB_REPLICA_HOST     host of a PostgreSQL read replica.
+#                           See rango/db.py for what is read from it.
+
+RANGO_DB = os.environ.get('RANGO_DB', 'sqlite')
+RANGO_DB_CONN_MAX_AGE = int(os.environ.get('RANGO_DB_CONN_MAX_AGE', 60))
+
+if RANGO_DB == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('RANGO_DB_NAME', 'rango'),
+            'USER': os.environ.get('RANGO_DB_USER', ''),
+            'PASSWORD': os.environ.get('RANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('RANGO_DB_HOST', ''),
+            'PORT': os.environ.get('RANGO_DB_PORT', ''),
+            'CONN_MAX_AGE': RANGO_DB_CONN_MAX_AGE,
+        }
+    }
+    if os.environ.get('RANGO_DB_REPLICA_HOST'):
+        DATABASES['replica'] = dict(DATABASES['default'],
+                                    HOST=os.environ['RANGO_DB_REPLICA_HOST'])
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('RANGO_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            # Kept open, so the pragmas below run once per connection
+            # rather than once per request
+            'CONN_MAX_AGE': RANGO_DB_CONN_MAX_AGE,
+            # Seconds a write waits for the lock before failing
+            'OPTIONS': {'timeout': 20},
+        }
     }
+    if os.environ.get('RANGO_DB_REPLICA_NAME'):
+        DATABASES['replica'] = dict(DATABASES['default'],
+                                    NAME=os.environ['RANGO_DB_REPLICA_NAME'])
+
+if 'replica' in DATABASES:
+    # Tests read the replica's data from the test primary
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['rango.db.ReplicaRouter']
+RANGO_REPLICA_DATABASE = 'replica'
+
+# Run on every new SQLite connection. The WAL journal, which lets
+# readers carry on while a write is in progress, is stored in the file:
+# migrate turns it on once, see rango/db.py. With it,
+# synchronous=NORMAL only risks the last transactions on power loss, not
+# corruption.
+RANGO_SQLITE_PRAGMAS = [
+    'synchronous = NORMAL',
+    'temp_store = MEMORY',
+    # Negative: in KiB, so 64 MB of page cache
+    'cache_size = -65536',
+    'mmap_size = 268435456',
+]
+
+# Cache
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+
+# The default cache must be shared by every process serving the site.
+# The leaderboards, the category sidebar and the page version stamps are
+# kept in step by signals, which only run in the process that changed the
+# data: a web worker, or manage.py import_rango. A per-process cache
+# (LocMemCache) would leave the other workers with stale lists and wrong
+# 304 answers. FileBasedCache shares it between the processes of one host,
+# use memcached or Redis when there are several hosts.
+# The leaderboards and sidebar also expire, see RANGO_LEADERBOARD_TIMEOUT
+# and RANGO_SIDEBAR_TIMEOUT, which bounds how long a change the signals
+# missed stays out of them.
+# manage.py test moves the file caches to a temporary directory, see
+# rango/test_runner.py.
+CACHE_DIR = os.environ.get('RANGO_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'default'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Sessions, see rango/sessions.py. A cache in front of the
+    # django_session table, shared like the default one, and separate so
+    # the sessions of cookieless bots don't push the leaderboards out.
+    # An evicted session is read back from the table.
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'sessions'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Whole responses for anonymous visitors, see rango/response_cache.py.
+    # Each process keeps its own; FileBasedCache shares them between the
+    # processes of one host. The generation that makes them stale is kept
+    # in the default cache.
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rango-responses',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
+SESSION_ENGINE = 'rango.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+
 # Password hashing
 PASSWORD_HASHERS = (
     'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
@@ -138,6 +253,15 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.9/howto/static-files/
 
 STATIC_URL = '/static/'
+# Where "manage.py build_static" collects the hashed and compressed
+# files, see rango/assets.py. Serve it with far-future expiry headers.
+STATIC_ROOT = os.path.join(BASE_DIR, 'static_root')
+STATICFILES_STORAGE = 'rango.assets.CompressedManifestStaticFilesStorage'
+RANGO_BUILD_DIR = BUILD_DIR
+# Scripts concatenated and minified into one file each
+RANGO_JS_BUNDLES = {
+    'js/rango.js': ['js/rango-jquery.js', 'js/rango-ajax.js'],
+}
 
 # Dynamic media files
 MEDIA_ROOT = MEDIA_DIR
@@ -155,3 +279,147 @@ LOGIN_REDIRECT_URL = '/rango/'
 # The page users are directed to if they are not logged in,
 # and are trying to access pages requiring authentication
 LOGIN_URL = '/accounts/login/'
+
+# CASA
+# Seconds a client id / auth token pair is reused by every session in the process
+CASA_TOKEN_TTL = 3600
+# Refresh the pair in the background this many seconds before it expires
+CASA_TOKEN_REFRESH_MARGIN = 300
+# How long a request waits for a token fetch already started by another request
+CASA_TOKEN_WAIT_TIMEOUT = 10
+# Keep-alive connections kept open to CASA per worker process
+CASA_POOL_SIZE = 10
+# Seconds to wait for a connection to CASA and then for its response
+CASA_CONNECT_TIMEOUT = 3.05
+CASA_READ_TIMEOUT = 10
+# Failed connection attempts are retried with exponential backoff
+CASA_MAX_RETRIES = 2
+CASA_RETRY_BACKOFF = 0.2
+# If True, a visit that finds no token waits for CASA (the old behaviour).
+# If False, the token is fetched in the background and the page is served
+# straight away, so a slow CASA does not hold up WSGI workers.
+CASA_BLOCKING_TOKEN_FETCH = False
+# Consecutive CASA failures that open the circuit breaker, and seconds it
+# stays open before a single probe request is let through
+CASA_BREAKER_FAILURE_THRESHOLD = 5
+CASA_BREAKER_RESET_TIMEOUT = 30
+
+# LOGGING
+# Records go through a queue to a background thread that writes them out.
+# DEBUG output from rango and urllib3 (CASA wire traffic) is only emitted
+# for requests that ask for it with ?_trace=1, see rango.middleware.
+RANGO_TRACE_PARAM = '_trace'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_trace': {
+            '()': 'rango.log.RequestTraceFilter',
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'rango.log.queue_handler',
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+            'filters': ['request_trace'],
+        },
+    },
+    'loggers': {
+        'rango': {
+            'handlers': ['queue'],
+            'level': 'DEBUG',
+            'propagate': False,
+        },
+        'urllib3': {
+            'handlers': ['queue'],
+            'level': 'DEBUG',
+            'propagate': False,
+        },
+    },
+}
+
+# VIEW COUNTING
+# Seconds between writes of buffered category/page views, and of the
+# daily visit counts, to the database. What was recorded since the last
+# write is lost if the process crashes.
+RANGO_VIEW_FLUSH_INTERVAL = 10
+# Flush early once this many categories/pages have views waiting
+RANGO_VIEW_BUFFER_MAX_KEYS = 10000
+
+# Number of categories and pages on the index page leaderboards
+RANGO_LEADERBOARD_SIZE = 5
+# Seconds before the leaderboards are rebuilt from the database anyway
+RANGO_LEADERBOARD_TIMEOUT = 60
+# Seconds before the category sidebar is rendered again anyway
+RANGO_SIDEBAR_TIMEOUT = 300
+# Pages shown per batch on a category page
+RANGO_PAGES_PER_PAGE = 20
+# Seconds each process remembers a category looked up by slug, and the
+# list of names suggestions come from. Changes made in other processes,
+# like manage.py import_rango, show up in them after that long.
+RANGO_CATEGORY_CACHE_TIMEOUT = 60
+RANGO_SUGGEST_TIMEOUT = 300
+
+# SEARCH
+# Number of results shown, and how many best bm25 matches per result are
+# reranked with the likes/views popularity boost
+RANGO_SEARCH_RESULTS = 20
+RANGO_SEARCH_CANDIDATES_FACTOR = 5
+# How much likes and views count against text relevance
+RANGO_SEARCH_POPULARITY_WEIGHT = 0.1
+# Category names suggested while typing
+RANGO_SUGGESTIONS = 8
+
+# REQUEST TIMING
+# Share of the requests timed by RequestTimingMiddleware, from 0 (off)
+# to 1 (all). Timed requests are counted in the histograms at
+# /rango/metrics/. Django logs the queries of a timed request, SQL
+# included, so production only samples a few.
+RANGO_TIMING_SAMPLE_RATE = 1.0 if DEBUG else 0.01
+# Send the Server-Timing header of a timed request to everyone. By
+# default only staff users, and traced requests in DEBUG mode, get it.
+RANGO_TIMING_HEADER = False
+# Token a scraper sends as "Authorization: Bearer <token>" to read
+# /rango/metrics/. Without one only staff users can read it.
+RANGO_METRICS_TOKEN = os.environ.get('RANGO_METRICS_TOKEN')
+
+# PROFILE PICTURES
+# Thumbnail sizes in pixels, and threads making them, see rango/images.py
+RANGO_THUMBNAIL_SIZES = [64, 128, 256]
+RANGO_THUMBNAIL_WORKERS = 2
+# Internal nginx location for MEDIA_ROOT, e.g. '/protected-media/'. When
+# set, the media view answers with X-Accel-Redirect and nginx sends the
+# file; when None, Django streams it.
+RANGO_MEDIA_ACCEL_REDIRECT = None
+
+# RESPONSE CACHE
+# Seconds anonymous responses of index, about and show_category are
+# served from the cache, 0 turns it off, see rango/response_cache.py.
+RANGO_RESPONSE_CACHE_TIMEOUT = 60
+# Seconds a stale response is still served while one request renews it
+RANGO_RESPONSE_CACHE_STALE_TIMEOUT = 60
+RANGO_RESPONSE_CACHE_ALIAS = 'responses'
+
+# JSON API, see rango/api.py
+# Anyone can read, writing needs a logged in user: a session, as in the
+# browser, or HTTP Basic credentials, as from the mobile client.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': (
+        'rest_framework.permissions.IsAuthenticatedOrReadOnly',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+    ),
+}
+# Categories or pages per batch of a list
+RANGO_API_PAGE_SIZE = 50
+# Most slugs in a batch lookup, and pages in a bulk creation
+RANGO_API_BATCH_SIZE = 100
+
+# Tests
+TEST_RUNNER = 'rango.test_runner.TestRunner'
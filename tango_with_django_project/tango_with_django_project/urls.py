@@ -16,7 +16,6 @@ Including another URLconf
 from django.conf.urls import url
 from django.contrib import admin
 from django.conf.urls import include
-from django.conf.urls.static import static
 from django.conf import settings
 from registration.backends.simple.views import RegistrationView
 from rango import views
@@ -38,4 +37,7 @@ urlpatterns = [
                   # with rango/ to be handled by
                   # the rango application
                   url(r'^admin/', admin.site.urls),
-              ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+                  # Uploaded files, see rango.views.media
+                  url(r'^{0}(?P<path>.+)$'.format(settings.MEDIA_URL.lstrip('/')),
+                      views.media, name='media'),
+              ]